@@ -0,0 +1,264 @@
+import configargparse
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from multiprocessing.connection import Listener, Client
+from RecognizerPool import RecognizerPool
+from SpeechRecognizer import RECOGNIZER_BACKENDS, check_compute_type, create_recognizer
+
+# Speech recognition in separate processes. A worker listens on a TCP socket
+# and answers ("transcribe", request_id, audios, language, model_name, keywords)
+# with ("result", request_id, texts) or ("error", request_id, message).
+# The bot talks to one or more workers through RemoteRecognizer, which has the
+# same interface as the in-process recognizers.
+# Connections unpickle whatever the authenticated peer sends, so the authkey
+# guards code execution in both processes and must be a real secret.
+
+DEFAULT_WORKER_ADDRESS = "127.0.0.1:6100"
+LOCAL_WORKER_START_TIMEOUT = 60
+AUTHKEY_ENV_VAR = "PRISONBOT_ASR_AUTHKEY"
+
+
+def parse_address(address):
+    host, port = address.rsplit(":", 1)
+    return host, int(port)
+
+
+class RecognizerSettings:
+    """Everything a worker needs to build its recognizers; sent to spawned workers."""
+
+    def __init__(self, backend, model_size, device=None, compute_type="default", threads=0, max_concurrency=1, preload=False):
+        self.backend = backend
+        self.model_size = model_size
+        self.device = device
+        self.compute_type = compute_type
+        self.threads = threads
+        self.max_concurrency = max_concurrency
+        self.preload = preload
+
+    def create_pool(self):
+        return RecognizerPool(
+            lambda model_name: create_recognizer(self.backend, model_name, self.device, self.compute_type, self.threads),
+            self.model_size,
+            self.max_concurrency
+        )
+
+
+class AsrWorkerServer:
+    def __init__(self, listener, pool):
+        self.listener = listener
+        self.pool = pool
+
+    def serve_forever(self):
+        logging.info(f"ASR worker listening on {self.listener.address}")
+        while True:
+            try:
+                connection = self.listener.accept()
+            except Exception as err:
+                logging.error(f"Failed to accept ASR client: {err}")
+                continue
+
+            thread = threading.Thread(target=self.handle_connection, args=(connection,), name="AsrWorkerConnection", daemon=True)
+            thread.start()
+
+    def handle_connection(self, connection):
+        logging.info(f"ASR client connected from {self.listener.last_accepted}")
+        with connection:
+            while True:
+                try:
+                    message = connection.recv()
+                except (EOFError, OSError):
+                    logging.info("ASR client disconnected")
+                    return
+
+                connection.send(self.handle_message(message))
+
+    def handle_message(self, message):
+        kind, request_id = message[0], message[1]
+
+        if kind == "ping":
+            return ("pong", request_id)
+
+        if kind != "transcribe":
+            return ("error", request_id, f"Unknown request '{kind}'")
+
+        _, _, audios, language, model_name, keywords = message
+        try:
+            texts = self.pool.transcribe_batch(audios, language, model_name, keywords)
+        except Exception as err:
+            logging.error(f"Transcription of a batch of {len(audios)} chunks failed: {err}")
+            return ("error", request_id, str(err))
+        return ("result", request_id, texts)
+
+
+def run_worker(address, authkey, settings, ready_connection=None):
+    listener = Listener(address, authkey=authkey)
+    pool = settings.create_pool()
+
+    if ready_connection is not None:
+        ready_connection.send(listener.address)
+        ready_connection.close()
+
+    if settings.preload:
+        # Requests arriving meanwhile wait for the model inside the pool
+        threading.Thread(target=pool.preload, name="AsrWorkerPreload", daemon=True).start()
+
+    AsrWorkerServer(listener, pool).serve_forever()
+
+
+def run_local_worker(authkey, settings, ready_connection, log_level):
+    logging.basicConfig(level=log_level, format='[{asctime}] [{levelname:<8}] [AsrWorker] {message}', style='{')
+    run_worker(("127.0.0.1", 0), authkey, settings, ready_connection)
+
+
+def spawn_local_workers(count, settings):
+    """Starts count worker processes on this host and returns (processes, addresses, authkey).
+
+    The workers get a random authkey that only this process knows.
+    """
+    authkey = os.urandom(32)
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    ready_connections = []
+
+    for i in range(count):
+        parent_connection, child_connection = context.Pipe(duplex=False)
+        process = context.Process(
+            target=run_local_worker,
+            args=(authkey, settings, child_connection, logging.getLogger().level),
+            name=f"AsrWorker-{i}",
+            daemon=True
+        )
+        process.start()
+        child_connection.close()
+        processes.append(process)
+        ready_connections.append(parent_connection)
+
+    addresses = []
+    for process, ready_connection in zip(processes, ready_connections):
+        if not ready_connection.poll(LOCAL_WORKER_START_TIMEOUT):
+            raise RuntimeError(f"ASR worker {process.name} did not start in {LOCAL_WORKER_START_TIMEOUT} seconds")
+        addresses.append(ready_connection.recv())
+        ready_connection.close()
+
+    logging.info(f"Started {count} local ASR workers on {', '.join(f'{host}:{port}' for host, port in addresses)}")
+    return processes, addresses, authkey
+
+
+class RemoteConnection:
+    __slots__ = ("address", "authkey", "connection", "request_ids")
+
+    def __init__(self, address, authkey):
+        self.address = address
+        self.authkey = authkey
+        self.connection = None
+        self.request_ids = itertools.count()
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except OSError:
+                pass
+            self.connection = None
+
+    def request(self, kind, *payload):
+        if self.connection is None:
+            self.connection = Client(self.address, authkey=self.authkey)
+
+        request_id = next(self.request_ids)
+        self.connection.send((kind, request_id) + payload)
+        reply = self.connection.recv()
+
+        if reply[1] != request_id:
+            raise ConnectionError(f"ASR worker {self.address} answered request {reply[1]} instead of {request_id}")
+        if reply[0] == "error":
+            raise RuntimeError(f"ASR worker {self.address} failed: {reply[2]}")
+        return reply[2] if len(reply) > 2 else None
+
+
+class RemoteRecognizer:
+    """Recognizer forwarding batches to ASR worker processes.
+
+    Every worker address gets connections_per_worker connections, each used by
+    one batch at a time. A broken connection is reopened and the batch retried
+    up to max_attempts times, waiting longer after every failure.
+    """
+
+    name = "remote"
+
+    def __init__(self, model_size, addresses, authkey, connections_per_worker=1, max_attempts=3, retry_delay=1.0):
+        self.model_size = model_size
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.idle_connections = queue.Queue()
+
+        for _ in range(max(1, connections_per_worker)):
+            for address in addresses:
+                self.idle_connections.put(RemoteConnection(address, authkey))
+
+    def load(self):
+        pass
+
+    def transcribe_batch(self, audios, language, keywords=None):
+        remote = self.idle_connections.get()
+        try:
+            for attempt in range(1, self.max_attempts + 1):
+                try:
+                    return remote.request("transcribe", audios, language, self.model_size, keywords)
+                except (EOFError, OSError) as err:
+                    remote.close()
+                    logging.warning(f"Connection to ASR worker {remote.address} failed (attempt {attempt}/{self.max_attempts}): {err}")
+                    if attempt < self.max_attempts:
+                        time.sleep(self.retry_delay * attempt)
+
+            raise ConnectionError(f"ASR worker {remote.address} is unavailable")
+        finally:
+            self.idle_connections.put(remote)
+
+
+def main():
+    parser = configargparse.ArgParser(
+                    prog='AsrWorkerService',
+                    description='Speech recognition worker for PrisonBot'
+                    )
+
+    parser.add('-c', '--config', required=False, is_config_file=True, help='Config file path')
+    parser.add_argument("--address", help="host:port to listen on", default=DEFAULT_WORKER_ADDRESS)
+    parser.add_argument("--authkey", help=f"Shared secret of the bot and its ASR workers (can also be set in {AUTHKEY_ENV_VAR})", env_var=AUTHKEY_ENV_VAR, required=True)
+    parser.add_argument("--asr_backend", help="Speech recognition engine", choices=list(RECOGNIZER_BACKENDS), default="whisper")
+    parser.add_argument("--asr_model", help="Default speech recognition model size", default="base")
+    parser.add_argument("--asr_device", help="Device running speech recognition, e.g. cpu or cuda (default: chosen by the engine)")
+    parser.add_argument("--asr_compute_type", help="Model precision: default, float16 or float32, or any CTranslate2 type such as int8 for faster-whisper", default="default")
+    parser.add_argument("--asr_threads", help="CPU threads used by speech recognition (0 lets the engine decide)", type=int, default=0)
+    parser.add_argument("--asr_max_concurrency", help="Maximum number of simultaneous transcriptions", type=int, default=1)
+    parser.add_argument("--asr_preload", help="Load the model at startup instead of on first use", action="store_true")
+    parser.add_argument("--log_level", help="Log level", choices=['DEBUG', 'INFO', 'WARNING', "ERROR", "FATAL"], default="INFO")
+
+    args = parser.parse_args()
+
+    try:
+        check_compute_type(args.asr_backend, args.asr_compute_type)
+    except ValueError as err:
+        parser.error(str(err))
+
+    logging.basicConfig(level=args.log_level, format='[{asctime}] [{levelname:<8}] [{threadName}] {message}', style='{')
+
+    settings = RecognizerSettings(
+        args.asr_backend,
+        args.asr_model,
+        args.asr_device,
+        args.asr_compute_type,
+        args.asr_threads,
+        args.asr_max_concurrency,
+        args.asr_preload
+    )
+    run_worker(parse_address(args.address), args.authkey.encode("utf-8"), settings)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+import numpy as np
+
+WHISPER_SAMPLING_RATE = 16000
+
+
+def pcm_to_whisper_audio(pcm_buffer, channels=2, sampling_rate=48000):
+    """Converts interleaved 16-bit PCM to float32 mono audio at 16 kHz.
+
+    Works on any object supporting the buffer protocol without copying it.
+    Channels are averaged and the signal is decimated by averaging groups of
+    consecutive samples, which also acts as a simple anti-aliasing filter.
+    """
+    decimation = sampling_rate // WHISPER_SAMPLING_RATE
+    group_size = channels * decimation
+
+    samples = np.frombuffer(pcm_buffer, np.int16)
+    usable_length = samples.size - samples.size % group_size
+    groups = samples[:usable_length].reshape(-1, group_size)
+
+    audio = groups.mean(axis=1, dtype=np.float32)
+    audio *= 1.0 / 32768.0
+    return audio
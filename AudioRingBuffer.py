@@ -0,0 +1,54 @@
+import numpy as np
+
+
+class AudioRingBuffer:
+    """Fixed-size, preallocated buffer holding the most recent audio samples.
+
+    Positions are absolute sample counts since the buffer was created, so a
+    reader can remember where it stopped and ask for everything after it as
+    long as the samples have not been overwritten yet.
+    """
+
+    def __init__(self, capacity, dtype=np.float32):
+        self.capacity = capacity
+        self.samples = np.zeros(capacity, dtype=dtype)
+        self.total_written = 0
+
+    @property
+    def oldest_position(self):
+        return max(0, self.total_written - self.capacity)
+
+    def write(self, samples):
+        length = samples.size
+        if length > self.capacity:
+            # Only the newest capacity samples survive; they still land at their absolute positions
+            self.total_written += length - self.capacity
+            samples = samples[-self.capacity:]
+            length = self.capacity
+
+        start = self.total_written % self.capacity
+        end = start + length
+        if end <= self.capacity:
+            self.samples[start:end] = samples
+        else:
+            split = self.capacity - start
+            self.samples[start:] = samples[:split]
+            self.samples[:end - self.capacity] = samples[split:]
+
+        self.total_written += length
+
+    def read(self, start_position, end_position=None):
+        if end_position is None:
+            end_position = self.total_written
+
+        start_position = max(start_position, self.oldest_position)
+        end_position = min(end_position, self.total_written)
+        if end_position <= start_position:
+            return self.samples[:0].copy()
+
+        start = start_position % self.capacity
+        end = start + end_position - start_position
+        if end <= self.capacity:
+            return self.samples[start:end].copy()
+
+        return np.concatenate((self.samples[start:], self.samples[:end - self.capacity]))
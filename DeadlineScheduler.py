@@ -0,0 +1,113 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+
+class DeadlineScheduler:
+    """Runs every timed action of the bot from a single task.
+
+    Deadlines are wall-clock timestamps kept in a heap. Rescheduling a key
+    replaces its deadline and cancelling forgets it; outdated heap entries are
+    skipped when they reach the top. All keys expiring within tick seconds of
+    each other are handed to expire_callback together as a list of
+    (key, payload) pairs.
+    """
+
+    def __init__(self, expire_callback, tick=0.5):
+        self.expire_callback = expire_callback
+        self.tick = tick
+        self.heap = []
+        self.entries = {}
+        self.sequence = itertools.count()
+        self.wakeup_event = asyncio.Event()
+        self.task = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def start(self, loop):
+        if self.task is None:
+            self.task = loop.create_task(self.run())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def schedule(self, key, deadline, payload=None):
+        sequence = next(self.sequence)
+        self.entries[key] = (deadline, sequence, payload)
+        heapq.heappush(self.heap, (deadline, sequence, key))
+
+        if self.heap[0][1] == sequence:
+            self.wakeup_event.set()
+
+    def extend(self, key, seconds):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+
+        deadline, _, payload = entry
+        deadline += seconds
+        self.schedule(key, deadline, payload)
+        return deadline
+
+    def cancel(self, key):
+        return self.entries.pop(key, None) is not None
+
+    def deadline(self, key):
+        entry = self.entries.get(key)
+        return entry[0] if entry else None
+
+    def drop_stale(self):
+        while self.heap:
+            deadline, sequence, key = self.heap[0]
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] == sequence:
+                return
+            heapq.heappop(self.heap)
+
+    def pop_expired(self, now):
+        expired = []
+        while self.heap:
+            deadline, sequence, key = self.heap[0]
+            if deadline > now:
+                break
+            heapq.heappop(self.heap)
+
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] == sequence:
+                del self.entries[key]
+                expired.append((key, entry[2]))
+        return expired
+
+    async def run(self):
+        while True:
+            self.drop_stale()
+            self.wakeup_event.clear()
+
+            if self.heap:
+                timeout = self.heap[0][0] - time.time()
+                if timeout > 0:
+                    try:
+                        await asyncio.wait_for(self.wakeup_event.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+            else:
+                await self.wakeup_event.wait()
+                continue
+
+            expired = self.pop_expired(time.time() + self.tick)
+            if not expired:
+                continue
+
+            try:
+                await self.expire_callback(expired)
+            except Exception as err:
+                logging.error(f"Failed to process {len(expired)} expired deadlines: {err}")
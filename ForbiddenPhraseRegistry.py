@@ -0,0 +1,140 @@
+import logging
+import os
+import os.path
+from PhraseMatcher import PhraseMatcher
+
+
+def read_phrase_file(path):
+    with open(path, "r", encoding="utf-8") as fin:
+        lines = [line.strip() for line in fin.readlines()]
+    return [line for line in lines if line]
+
+
+class ForbiddenPhraseRegistry:
+    """Global and per-guild forbidden phrase lists with their matchers.
+
+    The global list applies to every guild. A guild can extend it with its own
+    file named <guild id>.txt in guild_dir. Reloading is split in two steps:
+    scan_changes reads modified files, while apply_changes diffs the lists and
+    updates the matchers in place under their locks. Both may run in an
+    executor as long as reloads do not overlap; a new guild's matcher is
+    built before it is published, so readers never see it half filled.
+    """
+
+    def __init__(self, global_path, guild_dir=None):
+        self.global_path = global_path
+        self.guild_dir = guild_dir
+        self.phrase_lists = {None: []}
+        self.file_mtimes = {}
+        self.file_keys = {}
+        self.matchers = {None: PhraseMatcher()}
+
+    def matcher_for(self, guild_id):
+        return self.matchers.get(guild_id, self.matchers[None])
+
+    def phrase_files(self):
+        files = {self.global_path: None}
+
+        if self.guild_dir and os.path.isdir(self.guild_dir):
+            for filename in os.listdir(self.guild_dir):
+                name, extension = os.path.splitext(filename)
+                if extension == ".txt" and name.isdigit():
+                    files[os.path.join(self.guild_dir, filename)] = int(name)
+
+        return files
+
+    def scan_changes(self):
+        changes = {}
+        files = self.phrase_files()
+
+        for path, key in files.items():
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                continue
+
+            if self.file_mtimes.get(path) == mtime:
+                continue
+
+            try:
+                changes[key] = (path, mtime, read_phrase_file(path))
+            except OSError as err:
+                logging.error(f"Failed to read forbidden phrases from '{path}': {err}")
+
+        for path, key in self.file_keys.items():
+            if path not in files or not os.path.exists(path):
+                changes.setdefault(key, (path, None, []))
+
+        return changes
+
+    def apply_changes(self, changes):
+        added_total = 0
+        removed_total = 0
+
+        if None in changes:
+            added, removed = self.apply_global_change(*changes.pop(None))
+            added_total += added
+            removed_total += removed
+
+        for guild_id, change in changes.items():
+            added, removed = self.apply_guild_change(guild_id, *change)
+            added_total += added
+            removed_total += removed
+
+        return added_total, removed_total
+
+    def apply_global_change(self, path, mtime, phrases):
+        self.track_file(path, None, mtime)
+
+        old_phrases = set(self.phrase_lists[None])
+        new_phrases = set(phrases)
+        added = new_phrases - old_phrases
+        removed = old_phrases - new_phrases
+        self.phrase_lists[None] = phrases
+
+        for guild_id, matcher in self.matchers.items():
+            if guild_id is None:
+                matcher.update_phrases(added, removed)
+            else:
+                matcher.update_phrases(added, removed - set(self.phrase_lists[guild_id]))
+
+        logging.info(f"Forbidden phrases reloaded from '{path}': {len(added)} added, {len(removed)} removed")
+        return len(added), len(removed)
+
+    def apply_guild_change(self, guild_id, path, mtime, phrases):
+        self.track_file(path, guild_id, mtime)
+
+        global_phrases = set(self.phrase_lists[None])
+        old_phrases = set(self.phrase_lists.get(guild_id, []))
+        new_phrases = set(phrases)
+
+        if mtime is None:
+            self.phrase_lists.pop(guild_id, None)
+            self.matchers.pop(guild_id, None)
+            logging.info(f"Forbidden phrases of guild {guild_id} removed")
+            return 0, len(old_phrases - global_phrases)
+
+        added = new_phrases - old_phrases
+        removed = old_phrases - new_phrases
+        self.phrase_lists[guild_id] = phrases
+
+        if guild_id in self.matchers:
+            self.matchers[guild_id].update_phrases(added, removed - global_phrases)
+        else:
+            self.matchers[guild_id] = PhraseMatcher(self.phrase_lists[None] + phrases)
+
+        logging.info(f"Forbidden phrases of guild {guild_id} reloaded from '{path}': {len(added)} added, {len(removed)} removed")
+        return len(added), len(removed)
+
+    def track_file(self, path, key, mtime):
+        if mtime is None:
+            self.file_mtimes.pop(path, None)
+            self.file_keys.pop(path, None)
+        else:
+            self.file_mtimes[path] = mtime
+            self.file_keys[path] = key
+
+    def load(self):
+        if not os.path.exists(self.global_path):
+            logging.error(f"File {self.global_path} not found!")
+        return self.apply_changes(self.scan_changes())
@@ -0,0 +1,94 @@
+class GuildIndex:
+    """Dictionaries for looking up a guild's roles, channels and members.
+
+    Each table is built on first use and dropped by the matching invalidate
+    method, which the cog calls from Discord's role, channel and member events.
+    """
+
+    __slots__ = ("guild", "roles_by_id", "roles_by_name", "channels_by_name", "members_by_name")
+
+    def __init__(self, guild):
+        self.guild = guild
+        self.roles_by_id = None
+        self.roles_by_name = None
+        self.channels_by_name = None
+        self.members_by_name = None
+
+    def invalidate_roles(self):
+        self.roles_by_id = None
+        self.roles_by_name = None
+
+    def invalidate_channels(self):
+        self.channels_by_name = None
+
+    def invalidate_members(self):
+        self.members_by_name = None
+
+    def build_roles(self):
+        self.roles_by_id = {}
+        self.roles_by_name = {}
+        for role in self.guild.roles:
+            self.roles_by_id[role.id] = role
+            self.roles_by_name.setdefault(role.name, role)
+
+    def build_channels(self):
+        self.channels_by_name = {}
+        for channel in self.guild.channels:
+            self.channels_by_name.setdefault(channel.name, channel)
+
+    def build_members(self):
+        # Same precedence as Guild.get_member_named: the first member whose
+        # nick, name or global name matches, or an exact name#discriminator
+        self.members_by_name = {}
+        for member in self.guild.members:
+            self.members_by_name.setdefault(f"{member.name}#{member.discriminator}", member)
+            for name in (member.nick, member.name, member.global_name):
+                if name:
+                    self.members_by_name.setdefault(name, member)
+
+    def role_by_id(self, role_id):
+        if self.roles_by_id is None:
+            self.build_roles()
+        return self.roles_by_id.get(role_id)
+
+    def role_by_name(self, role_name):
+        if self.roles_by_name is None:
+            self.build_roles()
+        return self.roles_by_name.get(role_name)
+
+    def channel_by_name(self, channel_name):
+        if self.channels_by_name is None:
+            self.build_channels()
+        return self.channels_by_name.get(channel_name)
+
+    def member_by_name(self, name):
+        if self.members_by_name is None:
+            self.build_members()
+        return self.members_by_name.get(name)
+
+
+class GuildIndexCache:
+    def __init__(self):
+        self.indexes = {}
+
+    def get(self, guild):
+        index = self.indexes.get(guild.id)
+        if index is None or index.guild is not guild:
+            index = GuildIndex(guild)
+            self.indexes[guild.id] = index
+        return index
+
+    def invalidate(self, guild, roles=False, channels=False, members=False):
+        index = self.indexes.get(guild.id)
+        if index is None:
+            return
+
+        if roles:
+            index.invalidate_roles()
+        if channels:
+            index.invalidate_channels()
+        if members:
+            index.invalidate_members()
+
+    def remove(self, guild):
+        self.indexes.pop(guild.id, None)
@@ -0,0 +1,94 @@
+from PlaybackQueue import PlaybackQueue
+
+
+class Prisoner:
+    __slots__ = ("member_id", "role_backup", "nick_backup", "channel_backup", "escape_phrase", "detection_utterance", "detected_phrases")
+
+    def __init__(self, member_id, role_backup, nick_backup, channel_backup, escape_phrase=None):
+        self.member_id = member_id
+        self.role_backup = role_backup
+        self.nick_backup = nick_backup
+        self.channel_backup = channel_backup
+        self.escape_phrase = escape_phrase
+        # Phrases already acted on in the prisoner's latest utterance
+        self.detection_utterance = None
+        self.detected_phrases = set()
+
+    def first_detection(self, utterance_id, phrase):
+        """Returns False if the phrase was already detected in this utterance.
+
+        Partial results and overlapping chunks of one utterance repeat the
+        same words, which must be acted on once.
+        """
+        if utterance_id is None:
+            return True
+
+        if utterance_id != self.detection_utterance:
+            self.detection_utterance = utterance_id
+            self.detected_phrases.clear()
+
+        if phrase in self.detected_phrases:
+            return False
+        self.detected_phrases.add(phrase)
+        return True
+
+
+class GuildSession:
+    """Everything the bot keeps for one guild while it has prisoners or a voice connection."""
+
+    __slots__ = ("guild_id", "sink", "voice_client", "prisoners", "playback_queue", "timers")
+
+    def __init__(self, guild_id, loop):
+        self.guild_id = guild_id
+        self.sink = None
+        self.voice_client = None
+        self.prisoners = {}
+        self.playback_queue = PlaybackQueue(loop)
+        self.timers = set()
+
+    def is_idle(self):
+        return not self.prisoners and not self.timers and self.sink is None and self.voice_client is None
+
+    def stop_voice(self):
+        self.playback_queue.clear()
+        self.sink = None
+        self.voice_client = None
+
+
+class GuildSessionRegistry:
+    __slots__ = ("sessions", "loop")
+
+    def __init__(self, loop):
+        self.sessions = {}
+        self.loop = loop
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def __iter__(self):
+        return iter(self.sessions.values())
+
+    def get(self, guild_id):
+        return self.sessions.get(guild_id)
+
+    def get_or_create(self, guild_id):
+        session = self.sessions.get(guild_id)
+        if session is None:
+            session = GuildSession(guild_id, self.loop)
+            self.sessions[guild_id] = session
+        return session
+
+    def discard_if_idle(self, guild_id):
+        session = self.sessions.get(guild_id)
+        if session is not None and session.is_idle():
+            del self.sessions[guild_id]
+
+    def teardown(self, guild_id):
+        """Forgets a guild's session and stops its recording. The caller cancels its deadlines."""
+        session = self.sessions.pop(guild_id, None)
+        if session is not None:
+            if session.sink is not None:
+                session.sink.stop()
+            session.stop_voice()
+            session.prisoners.clear()
+        return session
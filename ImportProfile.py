@@ -0,0 +1,57 @@
+import configargparse
+import re
+import subprocess
+import sys
+
+# Measures how long importing a module takes in a fresh interpreter, using
+# Python's -X importtime, and lists the slowest imports. Used to keep the
+# bot's cold start fast: nothing heavy should be imported before bot.start.
+
+_importtime_regex = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(.+)$")
+
+
+def profile_import(module_name):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module_name} failed:\n{result.stderr}")
+
+    entries = []
+    for line in result.stderr.splitlines():
+        match = _importtime_regex.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((name.strip(), int(self_us), int(cumulative_us), len(indent) // 2))
+    return entries
+
+
+def main():
+    parser = configargparse.ArgParser(
+                    prog='ImportProfile',
+                    description='Import-time profile of PrisonBot modules'
+                    )
+
+    parser.add_argument("--module", help="Module to import", default="PrisonBot")
+    parser.add_argument("--top", help="Number of slowest imports to list", type=int, default=20)
+    parser.add_argument("--budget", help="Fail when the import takes longer than this (in seconds, 0 disables)", type=float, default=0)
+
+    args = parser.parse_args()
+
+    entries = profile_import(args.module)
+    total = next((cumulative for name, _, cumulative, _ in entries if name == args.module), 0) / 1e6
+
+    print(f"Importing {args.module} takes {total:.3f}s")
+    print(f"{'cumulative':>12} {'self':>10}  module")
+    for name, self_us, cumulative_us, _ in sorted(entries, key=lambda entry: entry[2], reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1e3:>10.1f}ms {self_us / 1e3:>8.1f}ms  {name}")
+
+    if args.budget > 0 and total > args.budget:
+        print(f"Import time exceeds the budget of {args.budget:.3f}s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
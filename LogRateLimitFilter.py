@@ -0,0 +1,41 @@
+import logging
+import threading
+import time
+
+
+class LogRateLimitFilter:
+    """Logging filter that limits how often each logging call site may emit.
+
+    Every call site (file and line) gets a token bucket refilled at rate
+    records per second and holding up to burst records. Records arriving with
+    an empty bucket are dropped, and the next record let through mentions how
+    many were suppressed. Warnings and errors are never dropped.
+    """
+
+    def __init__(self, rate, burst, min_unfiltered_level=logging.WARNING):
+        self.rate = rate
+        self.burst = burst
+        self.min_unfiltered_level = min_unfiltered_level
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= self.min_unfiltered_level:
+            return True
+
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+
+        with self.lock:
+            tokens, updated, suppressed = self.buckets.get(key, (self.burst, now, 0))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+
+            if tokens < 1:
+                self.buckets[key] = (tokens, now, suppressed + 1)
+                return False
+
+            self.buckets[key] = (tokens - 1, now, 0)
+
+        if suppressed:
+            record.msg = f"{record.msg} ({suppressed} similar messages suppressed)"
+        return True
@@ -0,0 +1,27 @@
+import discord
+
+
+class MemoryAudioSource(discord.AudioSource):
+    """Plays 48 kHz stereo 16-bit PCM that is already decoded in memory.
+
+    The PCM buffer is shared, not copied, so the same decoded announcement can
+    be played by any number of sources without spawning ffmpeg.
+    """
+
+    def __init__(self, pcm_data):
+        self.pcm_view = memoryview(pcm_data)
+        self.position = 0
+
+    def read(self):
+        frame_size = discord.opus.Encoder.FRAME_SIZE
+        frame = self.pcm_view[self.position:self.position + frame_size]
+        self.position += frame_size
+
+        if not frame:
+            return b""
+        if len(frame) < frame_size:
+            return bytes(frame) + bytes(frame_size - len(frame))
+        return bytes(frame)
+
+    def is_opus(self):
+        return False
@@ -0,0 +1,229 @@
+import bisect
+import logging
+import threading
+import time
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+
+class Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class Counter:
+    type_name = "counter"
+
+    def __init__(self, registry, name, description):
+        self.registry = registry
+        self.name = name
+        self.description = description
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        if not self.registry.enabled:
+            return
+        with self.lock:
+            self.value += amount
+
+    def samples(self):
+        return [(self.name, self.value)]
+
+
+class Gauge:
+    """A value that is set, or read from function when exported."""
+
+    type_name = "gauge"
+
+    def __init__(self, registry, name, description, function=None):
+        self.registry = registry
+        self.name = name
+        self.description = description
+        self.value = 0
+        self.function = function
+
+    def set(self, value):
+        if not self.registry.enabled:
+            return
+        self.value = value
+
+    def samples(self):
+        value = self.value
+        if self.function is not None:
+            try:
+                value = self.function()
+            except Exception as err:
+                logging.error(f"Failed to read gauge {self.name}: {err}")
+        return [(self.name, value)]
+
+
+class Histogram:
+    type_name = "histogram"
+
+    def __init__(self, registry, name, description, buckets=DEFAULT_BUCKETS):
+        self.registry = registry
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        if not self.registry.enabled:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self):
+        if not self.registry.enabled:
+            return NULL_TIMER
+        return Timer(self)
+
+    def samples(self):
+        with self.lock:
+            counts = list(self.counts)
+            total = self.sum
+            count = self.count
+
+        samples = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            samples.append((f'{self.name}_bucket{{le="{format_value(bound)}"}}', cumulative))
+        samples.append((f"{self.name}_sum", total))
+        samples.append((f"{self.name}_count", count))
+        return samples
+
+
+class MetricsRegistry:
+    """Counters, gauges and histograms of the running bot.
+
+    Metrics are declared at import time but only record anything once the
+    registry is enabled, so a disabled metric costs a single attribute check.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            existing = self.metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self.metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, description):
+        return self.register(Counter(self, name, description))
+
+    def gauge(self, name, description, function=None):
+        return self.register(Gauge(self, name, description, function))
+
+    def histogram(self, name, description, buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(self, name, description, buckets))
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            for sample_name, value in metric.samples():
+                lines.append(f"{sample_name} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """Short human-readable listing for the admin command."""
+        with self.lock:
+            metrics = list(self.metrics.values())
+
+        lines = []
+        for metric in metrics:
+            if isinstance(metric, Histogram):
+                with metric.lock:
+                    count = metric.count
+                    total = metric.sum
+                average = total / count if count else 0
+                # Only durations are shown in milliseconds, other histograms such as batch sizes are plain numbers
+                if metric.name.endswith("_seconds"):
+                    lines.append(f"{metric.name}: count={count} avg={average * 1000:.1f}ms")
+                else:
+                    lines.append(f"{metric.name}: count={count} avg={average:.2f}")
+            else:
+                lines.append(f"{metric.name}: {format_value(metric.samples()[0][1])}")
+        return "\n".join(lines)
+
+
+REGISTRY = MetricsRegistry()
+
+
+def counter(name, description):
+    return REGISTRY.counter(name, description)
+
+
+def gauge(name, description, function=None):
+    return REGISTRY.gauge(name, description, function)
+
+
+def histogram(name, description, buckets=DEFAULT_BUCKETS):
+    return REGISTRY.histogram(name, description, buckets)
+
+
+async def start_http_server(host, port, registry=REGISTRY):
+    """Serves registry in the Prometheus text format on http://host:port/metrics."""
+    from aiohttp import web
+
+    async def handle_metrics(request):
+        return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+
+    logging.info(f"Metrics are served on http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,264 @@
+import itertools
+import re
+import threading
+import numpy as np
+from collections import defaultdict
+
+
+MIN_TRIGRAM_OVERLAP = 0.25
+
+_non_word_regex = re.compile(r"[^\w\s]+")
+_spaces_regex = re.compile(r"\s+")
+
+_rapidfuzz = None
+
+
+def get_rapidfuzz():
+    # Imported on first use to keep it out of the bot's startup time
+    global _rapidfuzz
+    if _rapidfuzz is None:
+        import rapidfuzz
+        import rapidfuzz.process
+        _rapidfuzz = rapidfuzz
+    return _rapidfuzz
+
+
+def normalize_text(text):
+    text = _non_word_regex.sub(" ", text.lower())
+    return _spaces_regex.sub(" ", text).strip()
+
+
+def text_trigrams(normalized_text):
+    padded = f" {normalized_text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def phrase_word_count(normalized_phrase):
+    return normalized_phrase.count(" ") + 1
+
+
+def word_windows(words, phrase_length):
+    # Windows one word shorter and longer than the phrase, so dropped or merged words still match
+    windows = []
+    for window_length in range(max(1, phrase_length - 1), phrase_length + 2):
+        window_length = min(window_length, len(words))
+        for start in range(len(words) - window_length + 1):
+            windows.append(" ".join(words[start:start + window_length]))
+    return windows
+
+
+def score_cutoff(threshold):
+    # Scores are rounded, so accept anything that rounds up to the threshold
+    return max(0, threshold - 0.5)
+
+
+def best_window_match(words, phrase):
+    """Finds the run of words in an utterance closest to the phrase.
+
+    Returns (score, matched_text).
+    """
+    if not words:
+        return 0, ""
+
+    rapidfuzz = get_rapidfuzz()
+    matched_text, score, _ = rapidfuzz.process.extractOne(phrase, word_windows(words, phrase_word_count(phrase)), scorer=rapidfuzz.fuzz.ratio)
+    return round(score), matched_text
+
+
+def phrase_score(text, phrase):
+    return best_window_match(normalize_text(text).split(" "), normalize_text(phrase))
+
+
+def sentence_score(text, phrase):
+    # Whole-sentence similarity; unlike phrase_score, ordinary speech sharing a word or two with the phrase scores low
+    return round(get_rapidfuzz().fuzz.ratio(normalize_text(text), normalize_text(phrase)))
+
+
+class PhraseMatch:
+    __slots__ = ("phrase", "score", "matched_text")
+
+    def __init__(self, phrase, score, matched_text):
+        self.phrase = phrase
+        self.score = score
+        self.matched_text = matched_text
+
+    def __repr__(self):
+        return f"PhraseMatch({self.phrase!r}, {self.score}, {self.matched_text!r})"
+
+
+class PhraseMatcher:
+    """Fuzzy matcher for a set of phrases, built once and updated in place.
+
+    Phrases are indexed by character trigrams. Only phrases sharing enough
+    trigrams with a single word window of an utterance are scored, and each
+    one is compared against word windows of the utterance, so a phrase is
+    found anywhere inside it. Matching and phrase updates may run on
+    different threads, so both take the matcher's lock.
+    """
+
+    def __init__(self, phrases=()):
+        self.phrase_ids = {}
+        self.phrases = []
+        self.normalized_phrases = []
+        self.phrase_trigrams = []
+        self.phrase_word_counts = []
+        # Slots of removed phrases, reused so hot reloads do not grow the lists
+        self.free_ids = []
+        self.trigram_index = defaultdict(set)
+        self.lock = threading.RLock()
+
+        for phrase in phrases:
+            self.add_phrase(phrase)
+
+    def __len__(self):
+        return len(self.phrase_ids)
+
+    def __contains__(self, phrase):
+        return phrase in self.phrase_ids
+
+    def phrase_list(self):
+        with self.lock:
+            return list(self.phrase_ids)
+
+    def add_phrase(self, phrase):
+        with self.lock:
+            self.add_phrase_locked(phrase)
+
+    def add_phrase_locked(self, phrase):
+        normalized = normalize_text(phrase)
+        if not normalized or phrase in self.phrase_ids:
+            return
+
+        trigrams = text_trigrams(normalized)
+
+        if self.free_ids:
+            phrase_id = self.free_ids.pop()
+            self.phrases[phrase_id] = phrase
+            self.normalized_phrases[phrase_id] = normalized
+            self.phrase_trigrams[phrase_id] = trigrams
+            self.phrase_word_counts[phrase_id] = phrase_word_count(normalized)
+        else:
+            phrase_id = len(self.phrases)
+            self.phrases.append(phrase)
+            self.normalized_phrases.append(normalized)
+            self.phrase_trigrams.append(trigrams)
+            self.phrase_word_counts.append(phrase_word_count(normalized))
+
+        self.phrase_ids[phrase] = phrase_id
+        for trigram in trigrams:
+            self.trigram_index[trigram].add(phrase_id)
+
+    def remove_phrase(self, phrase):
+        with self.lock:
+            self.remove_phrase_locked(phrase)
+
+    def remove_phrase_locked(self, phrase):
+        phrase_id = self.phrase_ids.pop(phrase, None)
+        if phrase_id is None:
+            return
+
+        for trigram in self.phrase_trigrams[phrase_id]:
+            phrase_ids = self.trigram_index[trigram]
+            phrase_ids.discard(phrase_id)
+            if not phrase_ids:
+                del self.trigram_index[trigram]
+
+        # Ids are positions in the lists, so the slot is emptied and reused by the next added phrase
+        self.phrases[phrase_id] = None
+        self.normalized_phrases[phrase_id] = None
+        self.phrase_trigrams[phrase_id] = None
+        self.phrase_word_counts[phrase_id] = None
+        self.free_ids.append(phrase_id)
+
+    def update_phrases(self, added, removed):
+        with self.lock:
+            for phrase in removed:
+                self.remove_phrase_locked(phrase)
+            for phrase in added:
+                self.add_phrase_locked(phrase)
+
+    def candidates(self, words):
+        """Ids of phrases sharing enough trigrams with a window of the utterance.
+
+        Windows are one word longer than the phrase. Overlap with the whole
+        utterance is not enough: short phrases collect trigrams from all over
+        a long utterance and would nearly all be scored.
+        """
+        text_trigram_list = list(text_trigrams(" ".join(words)))
+
+        rows = []
+        columns = []
+        for column, trigram in enumerate(text_trigram_list):
+            phrase_ids = self.trigram_index.get(trigram, ())
+            rows.extend(phrase_ids)
+            columns.extend(itertools.repeat(column, len(phrase_ids)))
+
+        if not rows:
+            return []
+
+        # Phrase by text trigram incidence, multiplied by trigram by window incidence below
+        phrase_ids, rows = np.unique(np.array(rows), return_inverse=True)
+        incidence = np.zeros((len(phrase_ids), len(text_trigram_list)), dtype=np.float32)
+        incidence[rows, columns] = 1
+
+        required = MIN_TRIGRAM_OVERLAP * np.array([len(self.phrase_trigrams[phrase_id]) for phrase_id in phrase_ids])
+        window_lengths = np.minimum(np.array([self.phrase_word_counts[phrase_id] for phrase_id in phrase_ids]) + 1, len(words))
+        trigram_columns = {trigram: column for column, trigram in enumerate(text_trigram_list)}
+
+        candidates = []
+        for window_length in np.unique(window_lengths):
+            window_count = len(words) - window_length + 1
+            window_incidence = np.zeros((len(text_trigram_list), window_count), dtype=np.float32)
+            for start in range(window_count):
+                for trigram in text_trigrams(" ".join(words[start:start + window_length])):
+                    window_incidence[trigram_columns[trigram], start] = 1
+
+            selected = window_lengths == window_length
+            overlaps = (incidence[selected] @ window_incidence).max(axis=1)
+            candidates.extend(phrase_ids[selected][overlaps >= required[selected]].tolist())
+
+        return candidates
+
+    def match(self, text, threshold=80, limit=None):
+        normalized_text = normalize_text(text)
+        if not normalized_text:
+            return []
+
+        with self.lock:
+            matches = self.match_locked(normalized_text.split(" "), threshold)
+
+        matches.sort(key=lambda match: match.score, reverse=True)
+        if limit is not None:
+            matches = matches[:limit]
+        return matches
+
+    def match_locked(self, words, threshold):
+        matches = []
+
+        # Phrases of the same length are compared against the same windows,
+        # so each group is scored in one call
+        groups = defaultdict(list)
+        for phrase_id in self.candidates(words):
+            groups[phrase_word_count(self.normalized_phrases[phrase_id])].append(phrase_id)
+
+        rapidfuzz = get_rapidfuzz()
+        for phrase_length, phrase_ids in groups.items():
+            windows = word_windows(words, phrase_length)
+            scores = rapidfuzz.process.cdist(
+                [self.normalized_phrases[phrase_id] for phrase_id in phrase_ids],
+                windows,
+                scorer=rapidfuzz.fuzz.ratio,
+                score_cutoff=score_cutoff(threshold)
+            )
+
+            for phrase_id, row in zip(phrase_ids, scores):
+                best = int(row.argmax())
+                score = round(row[best])
+                if score >= threshold:
+                    matches.append(PhraseMatch(self.phrases[phrase_id], score, windows[best]))
+
+        return matches
+
+    def best_match(self, text, threshold=80):
+        matches = self.match(text, threshold, limit=1)
+        return matches[0] if matches else None
@@ -0,0 +1,99 @@
+import heapq
+import itertools
+import logging
+
+
+PRIORITY_ANNOUNCEMENT = 0
+PRIORITY_FORBIDDEN = 1
+
+
+class PlaybackItem:
+    __slots__ = ("priority", "sequence", "key", "source_factory", "callbacks")
+
+    def __init__(self, priority, sequence, key, source_factory, callback):
+        self.priority = priority
+        self.sequence = sequence
+        self.key = key
+        self.source_factory = source_factory
+        self.callbacks = [callback] if callback else []
+
+    def __lt__(self, other):
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+
+class PlaybackQueue:
+    """Plays audio sources on one voice client one after another.
+
+    Items with a lower priority value play first, items of equal priority in
+    the order they were queued. Queuing a key that is already waiting does not
+    add a second playback: the new callback is attached to the pending item.
+    Callbacks receive the playback error (or None) on the event loop thread.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.heap = []
+        self.pending = {}
+        self.sequence = itertools.count()
+        self.current = None
+        self.voice_client = None
+
+    def __len__(self):
+        return len(self.heap)
+
+    def enqueue(self, voice_client, key, source_factory, callback=None, priority=PRIORITY_ANNOUNCEMENT):
+        self.voice_client = voice_client
+
+        item = self.pending.get(key)
+        if item is not None:
+            logging.info(f"Playback of '{key}' is already queued, coalescing")
+            if callback:
+                item.callbacks.append(callback)
+            return
+
+        item = PlaybackItem(priority, next(self.sequence), key, source_factory, callback)
+        self.pending[key] = item
+        heapq.heappush(self.heap, item)
+
+        self.play_next()
+
+    def play_next(self):
+        while self.current is None and self.heap:
+            item = heapq.heappop(self.heap)
+            del self.pending[item.key]
+
+            if self.voice_client is None or not self.voice_client.is_connected():
+                self.finish(item, Exception("Voice client is not connected"))
+                continue
+
+            if self.voice_client.is_playing():
+                # Something outside the queue is playing, retry when it is done
+                heapq.heappush(self.heap, item)
+                self.pending[item.key] = item
+                self.loop.call_later(0.5, self.play_next)
+                return
+
+            try:
+                source = item.source_factory()
+                self.voice_client.play(source, after=lambda error, item=item: self.loop.call_soon_threadsafe(self.playback_finished, item, error))
+                self.current = item
+            except Exception as err:
+                logging.error(f"Failed to start playback of '{item.key}': {err}")
+                self.finish(item, err)
+
+    def playback_finished(self, item, error):
+        if self.current is item:
+            self.current = None
+        self.finish(item, error)
+        self.play_next()
+
+    def finish(self, item, error):
+        for callback in item.callbacks:
+            try:
+                callback(error)
+            except Exception as err:
+                logging.error(f"Playback callback of '{item.key}' failed: {err}")
+
+    def clear(self):
+        self.heap.clear()
+        self.pending.clear()
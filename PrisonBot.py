@@ -5,25 +5,42 @@ import os.path
 import logging
 import logging.handlers
 import asyncio
+import queue
 from discord.ext import commands
 import PunishmentCog
+import Metrics
+from LogRateLimitFilter import LogRateLimitFilter
+from AsrWorkerService import AUTHKEY_ENV_VAR
+from SpeechRecognizer import check_compute_type
 
 background_tasks = []
 
+MESSAGES = Metrics.counter("prisonbot_messages_total", "Messages seen by the bot")
+# Loggers of the high-frequency paths, which can be given their own levels and are rate limited
+SAMPLED_LOGGERS = ("prisonbot.messages", "prisonbot.audio", "prisonbot.transcription", "prisonbot.recognition")
+
+message_logger = logging.getLogger("prisonbot.messages")
+
+COMMAND_SECONDS = Metrics.histogram("prisonbot_message_processing_seconds", "Time spent processing a message, including commands it runs")
+
 class PrisonBotClient(commands.Bot):
 
     def __init__(self, intents, args):
         super().__init__(command_prefix=commands.when_mentioned_or(args.command_prefix), intents=intents)
         self.args = args
+        Metrics.gauge("prisonbot_gateway_latency_seconds", "Discord gateway heartbeat latency", lambda: self.latency)
 
     async def on_ready(self):
         logging.info(f'Logged on as {self.user}')
 
     async def on_message(self, message):
-        logging.info(f'Message from {message.author}: {message.content}')
+        if message_logger.isEnabledFor(logging.DEBUG):
+            message_logger.debug(f'Message from {message.author}: {message.content}')
+        MESSAGES.inc()
 
         # Allows the bot to process commands.
-        await self.process_commands(message)
+        with COMMAND_SECONDS.time():
+            await self.process_commands(message)
 
 @commands.command()
 async def prisonbot_echo(ctx, msg):
@@ -43,7 +60,14 @@ def create_bot(args):
 
     return bot
 
-def configure_logging(logs_dir="logs", log_level = logging.INFO):
+def configure_logging(logs_dir="logs", log_level = logging.INFO, subsystem_levels=None, rate_limit=0, rate_burst=10, use_queue=True):
+    """Sets up console and rotating file logging.
+
+    With use_queue, records are handed to a QueueListener thread that does the
+    formatting and disk I/O, so logging never blocks the event loop or the
+    voice decoder thread. Returns the listener, which must be stopped on exit,
+    or None.
+    """
 
     log_file = os.path.join(logs_dir, "dbot.log")
 
@@ -66,8 +90,36 @@ def configure_logging(logs_dir="logs", log_level = logging.INFO):
     # Setup default logger
     logger_default = logging.getLogger()
     logger_default.setLevel(log_level)
-    logger_default.addHandler(handler_rotating)
-    logger_default.addHandler(handler_console)
+
+    listener = None
+    if use_queue:
+        log_queue = queue.SimpleQueue()
+        logger_default.addHandler(logging.handlers.QueueHandler(log_queue))
+        listener = logging.handlers.QueueListener(log_queue, handler_rotating, handler_console, respect_handler_level=True)
+        listener.start()
+    else:
+        logger_default.addHandler(handler_rotating)
+        logger_default.addHandler(handler_console)
+
+    for name, level in (subsystem_levels or {}).items():
+        logging.getLogger(name).setLevel(level)
+
+    if rate_limit > 0:
+        rate_limit_filter = LogRateLimitFilter(rate_limit, rate_burst)
+        for name in SAMPLED_LOGGERS:
+            logging.getLogger(name).addFilter(rate_limit_filter)
+
+    return listener
+
+
+def parse_subsystem_levels(values):
+    levels = {}
+    for value in values or []:
+        name, level = value.split("=", 1)
+        if not name.startswith("prisonbot."):
+            name = f"prisonbot.{name}"
+        levels[name] = level.upper()
+    return levels
 
 
 async def main():
@@ -80,6 +132,8 @@ async def main():
 
     parser.add('-c', '--config', required=False, is_config_file=True, help='Config file path', default="config/config.conf")
     parser.add('--forbidden_path', required=False, help='Path to list of forbidden phrases', default="config/forbidden_phrases.txt")
+    parser.add('--forbidden_guild_dir', required=False, help='Directory with per-guild forbidden phrase lists named <guild id>.txt (default: <config_dir>/forbidden_phrases)')
+    parser.add('--forbidden_reload_interval', required=False, help='How often to check forbidden phrase files for changes (in seconds, 0 disables)', type=float, default=10)
 
     group = parser.add_mutually_exclusive_group(required=True)
 
@@ -88,9 +142,14 @@ async def main():
 
     parser.add_argument("--command_prefix", help="Commands prefix", default="$")
     parser.add_argument("--log_level", help= "Log level", choices=['DEBUG', 'INFO', 'WARNING', "ERROR", "FATAL"], default="INFO")
-    parser.add_argument("--log_dir", help= "Directory for log files")
+    parser.add_argument("--log_dir", help= "Directory for log files", default="logs")
+    parser.add_argument("--log_levels", help="Per-subsystem log levels, e.g. messages=DEBUG audio=WARNING (subsystems: messages, audio, transcription, recognition)", nargs="*")
+    parser.add_argument("--log_rate_limit", help="Records per second each high-frequency log line may emit (0 disables the limit)", type=float, default=1)
+    parser.add_argument("--log_rate_burst", help="Records a high-frequency log line may emit at once before the rate limit applies", type=int, default=10)
+    parser.add_argument("--log_sync", help="Write log records from the logging thread itself instead of a background writer", action="store_true")
     parser.add_argument("--config_dir", help= "Directory for config files", default="config")
     parser.add_argument("--downloads_dir", help = "Directory for downloads", default = "downloads")
+    parser.add_argument("--state_db", help="SQLite database keeping prisoners across restarts", default="state/prisoners.db")
     parser.add_argument("--prison_channel", help="Prison channel name", default="Prison")
     parser.add_argument("--prisoner_role", help="Prisoner role name", default="Prisoner")
     parser.add_argument("--admin_roles", help="Admin role name", nargs="*")
@@ -98,14 +157,63 @@ async def main():
     parser.add_argument("--tts_punish_pattern", help="Announcement pattern for imprisonment", type=str, default="{}, say {}")
     parser.add_argument("--tts_forbidden_pattern", help="Announcement pattern for forbidden words", type=str, default="Shut up, {}")
     parser.add_argument("--tts_language", help="Announcement language", type=str, default="en")
+    parser.add_argument("--tts_backend", help="Speech synthesis engine for announcements", choices=["gtts", "espeak"], default="gtts")
+    parser.add_argument("--tts_cache_dir", help="Directory for cached announcements (default: <downloads_dir>/tts_cache)")
+    parser.add_argument("--tts_memory_cache_size", help="Decoded announcement audio kept in memory (in MiB)", type=int, default=64)
+    parser.add_argument("--tts_disk_cache_size", help="Announcement audio kept on disk (in MiB)", type=int, default=256)
     parser.add_argument("--whisper_language", help="Announcement language", type=str, default="en")
+    parser.add_argument("--asr_backend", help="Speech recognition engine", choices=["whisper", "faster-whisper"], default="whisper")
+    parser.add_argument("--asr_model", help="Speech recognition model size shared by all voice channels (tiny, base, small, ...)", type=str, default="base")
+    parser.add_argument("--asr_device", help="Device running speech recognition, e.g. cpu or cuda (default: chosen by the engine)")
+    parser.add_argument("--asr_compute_type", help="Model precision: default, float16 or float32, or any CTranslate2 type such as int8 for faster-whisper", type=str, default="default")
+    parser.add_argument("--asr_threads", help="CPU threads used by speech recognition (0 lets the engine decide)", type=int, default=0)
+    parser.add_argument("--asr_workers", help="Run speech recognition in this many local worker processes instead of the bot process (0 disables)", type=int, default=0)
+    parser.add_argument("--asr_worker_addresses", help="host:port of running AsrWorkerService processes to use instead of local recognition", nargs="*")
+    parser.add_argument("--asr_worker_connections", help="Simultaneous batches sent to each ASR worker", type=int, default=1)
+    parser.add_argument("--asr_worker_authkey", help=f"Shared secret of the bot and the AsrWorkerService processes in --asr_worker_addresses (can also be set in {AUTHKEY_ENV_VAR})", env_var=AUTHKEY_ENV_VAR)
+    parser.add_argument("--asr_streaming", help="Also transcribe unfinished speech, so escape and forbidden phrases are found while the prisoner is still talking", action="store_true")
+    parser.add_argument("--asr_partial_interval", help="Seconds of new speech between partial transcriptions in streaming mode", type=float, default=0.5)
+    parser.add_argument("--asr_keyword_spotting", help="Prime recognition with the escape and forbidden phrases and stop decoding as soon as one is heard", action="store_true")
+    parser.add_argument("--asr_max_concurrency", help="Maximum number of simultaneous transcriptions", type=int, default=1)
+    parser.add_argument("--transcription_workers", help="Number of threads running speech transcription", type=int, default=1)
+    parser.add_argument("--transcription_queue_size", help="Maximum number of audio chunks waiting for transcription before the oldest are dropped", type=int, default=16)
+    parser.add_argument("--transcription_batch_size", help="Maximum number of audio chunks transcribed together in one batch", type=int, default=8)
+    parser.add_argument("--transcription_batch_window", help="How long to wait for more chunks before running a batch (in seconds)", type=float, default=0.05)
+    parser.add_argument("--warmup", help="Load speech recognition, phrase matching and speech synthesis in the background at startup instead of on first punishment", action="store_true")
     parser.add_argument("--punish_nick_pattern", help="Pattern for nickname change", type=str, default="Scum ({})")
+    parser.add_argument("--discord_api_concurrency", help="Maximum number of member updates sent to Discord at the same time", type=int, default=5)
+    parser.add_argument("--metrics", help="Collect performance metrics, viewable with the metrics command", action="store_true")
+    parser.add_argument("--metrics_host", help="Address of the metrics HTTP endpoint", default="127.0.0.1")
+    parser.add_argument("--metrics_port", help="Port of the Prometheus metrics HTTP endpoint (0 disables it, any other value also enables --metrics)", type=int, default=0)
     parser.add_argument("--forbidden_mute_duration", help="Mute duration for saying a forbidden phrase (in seconds)", type=int, default=30)
 
     args = parser.parse_args()
 
-    configure_logging(args.log_level)
+    try:
+        check_compute_type(args.asr_backend, args.asr_compute_type)
+    except ValueError as err:
+        parser.error(str(err))
+
+    if args.asr_worker_addresses and not args.asr_worker_authkey:
+        parser.error("--asr_worker_authkey is required with --asr_worker_addresses")
+
+    log_listener = configure_logging(
+        args.log_dir,
+        args.log_level,
+        parse_subsystem_levels(args.log_levels),
+        args.log_rate_limit,
+        args.log_rate_burst,
+        not args.log_sync
+    )
+
+    try:
+        await run_bot(args)
+    finally:
+        if log_listener:
+            log_listener.stop()
+
 
+async def run_bot(args):
     api_token = None
 
     if args.token is not None:
@@ -122,8 +230,13 @@ async def main():
         usernames = args.admin_usernames.strip().split(" ")
         args.admin_usernames = usernames
 
+    Metrics.REGISTRY.enabled = args.metrics or args.metrics_port > 0
+
     bot = create_bot(args)
 
+    if args.metrics_port > 0:
+        await Metrics.start_http_server(args.metrics_host, args.metrics_port)
+
     await bot.start(api_token)
 
 
@@ -0,0 +1,169 @@
+import json
+import logging
+import os
+import os.path
+import sqlite3
+import threading
+
+
+class PrisonerRecord:
+    __slots__ = ("member_id", "guild_id", "text_channel_id", "role_ids", "nick", "voice_channel_id", "escape_phrase", "pardon_deadline")
+
+    def __init__(self, member_id, guild_id, text_channel_id, role_ids, nick, voice_channel_id, escape_phrase, pardon_deadline):
+        self.member_id = member_id
+        self.guild_id = guild_id
+        self.text_channel_id = text_channel_id
+        self.role_ids = role_ids
+        self.nick = nick
+        self.voice_channel_id = voice_channel_id
+        self.escape_phrase = escape_phrase
+        self.pardon_deadline = pardon_deadline
+
+    def to_row(self):
+        return (
+            self.member_id,
+            self.guild_id,
+            self.text_channel_id,
+            json.dumps(self.role_ids),
+            self.nick,
+            self.voice_channel_id,
+            self.escape_phrase,
+            self.pardon_deadline,
+        )
+
+    @staticmethod
+    def from_row(row):
+        member_id, guild_id, text_channel_id, role_ids, nick, voice_channel_id, escape_phrase, pardon_deadline = row
+        return PrisonerRecord(member_id, guild_id, text_channel_id, json.loads(role_ids), nick, voice_channel_id, escape_phrase, pardon_deadline)
+
+
+class PrisonerStore:
+    """SQLite store of prisoner snapshots so sentences survive a restart.
+
+    The database runs in WAL mode. put and remove only record the change in
+    memory; a background thread writes all pending changes in one transaction
+    every flush_interval seconds, so punishing or pardoning many members costs
+    a single commit. Mutes for forbidden phrases are kept separately, since
+    they can outlast the prisoner's sentence.
+    """
+
+    def __init__(self, path, flush_interval=1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.connection = None
+        self.connection_lock = threading.Lock()
+        self.pending = {}
+        self.pending_mutes = {}
+        self.pending_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.flush_thread = None
+
+    def open(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            """CREATE TABLE IF NOT EXISTS prisoners (
+                member_id INTEGER NOT NULL,
+                guild_id INTEGER NOT NULL,
+                text_channel_id INTEGER,
+                role_ids TEXT NOT NULL,
+                nick TEXT,
+                voice_channel_id INTEGER,
+                escape_phrase TEXT,
+                pardon_deadline REAL,
+                PRIMARY KEY (guild_id, member_id)
+            )"""
+        )
+        self.connection.execute(
+            """CREATE TABLE IF NOT EXISTS mutes (
+                guild_id INTEGER NOT NULL,
+                member_id INTEGER NOT NULL,
+                unmute_deadline REAL NOT NULL,
+                PRIMARY KEY (guild_id, member_id)
+            )"""
+        )
+        self.connection.commit()
+
+        self.flush_thread = threading.Thread(target=self.flush_loop, name="PrisonerStoreFlush", daemon=True)
+        self.flush_thread.start()
+
+    def close(self):
+        self.stop_event.set()
+        if self.flush_thread:
+            self.flush_thread.join()
+        self.flush()
+
+        with self.connection_lock:
+            if self.connection:
+                self.connection.close()
+                self.connection = None
+
+    def load_all(self):
+        with self.connection_lock:
+            rows = self.connection.execute(
+                "SELECT member_id, guild_id, text_channel_id, role_ids, nick, voice_channel_id, escape_phrase, pardon_deadline FROM prisoners"
+            ).fetchall()
+        return [PrisonerRecord.from_row(row) for row in rows]
+
+    def load_mutes(self):
+        """Returns (guild_id, member_id, unmute_deadline) of every stored mute."""
+        with self.connection_lock:
+            return self.connection.execute("SELECT guild_id, member_id, unmute_deadline FROM mutes").fetchall()
+
+    def put(self, record):
+        with self.pending_lock:
+            self.pending[(record.guild_id, record.member_id)] = record
+
+    def remove(self, guild_id, member_id):
+        with self.pending_lock:
+            self.pending[(guild_id, member_id)] = None
+
+    def put_mute(self, guild_id, member_id, unmute_deadline):
+        with self.pending_lock:
+            self.pending_mutes[(guild_id, member_id)] = unmute_deadline
+
+    def remove_mute(self, guild_id, member_id):
+        with self.pending_lock:
+            self.pending_mutes[(guild_id, member_id)] = None
+
+    def flush(self):
+        with self.pending_lock:
+            if not self.pending and not self.pending_mutes:
+                return
+            pending = self.pending
+            pending_mutes = self.pending_mutes
+            self.pending = {}
+            self.pending_mutes = {}
+
+        upserts = [record.to_row() for record in pending.values() if record is not None]
+        deletes = [key for key, record in pending.items() if record is None]
+        mute_upserts = [key + (deadline,) for key, deadline in pending_mutes.items() if deadline is not None]
+        mute_deletes = [key for key, deadline in pending_mutes.items() if deadline is None]
+
+        try:
+            with self.connection_lock:
+                with self.connection:
+                    if deletes:
+                        self.connection.executemany("DELETE FROM prisoners WHERE guild_id = ? AND member_id = ?", deletes)
+                    if upserts:
+                        self.connection.executemany("INSERT OR REPLACE INTO prisoners VALUES (?, ?, ?, ?, ?, ?, ?, ?)", upserts)
+                    if mute_deletes:
+                        self.connection.executemany("DELETE FROM mutes WHERE guild_id = ? AND member_id = ?", mute_deletes)
+                    if mute_upserts:
+                        self.connection.executemany("INSERT OR REPLACE INTO mutes VALUES (?, ?, ?)", mute_upserts)
+        except sqlite3.Error as err:
+            logging.error(f"Failed to save prisoners: {err}")
+            with self.pending_lock:
+                for key, record in pending.items():
+                    self.pending.setdefault(key, record)
+                for key, deadline in pending_mutes.items():
+                    self.pending_mutes.setdefault(key, deadline)
+
+    def flush_loop(self):
+        while not self.stop_event.wait(self.flush_interval):
+            self.flush()
@@ -1,160 +1,604 @@
-from datetime import datetime, timedelta
 import discord
 from discord.ext import commands
 import logging
-from ContextMap import ContextMap
 import asyncio
 from SpeechRecognitionSink import SpeechRecognitionSink
-from fuzzywuzzy import fuzz
-from gtts import gTTS
+import RecognizerPool
+from SpeechRecognizer import create_recognizer
+from AsrWorkerService import RecognizerSettings, RemoteRecognizer, parse_address, spawn_local_workers
+from TranscriptionScheduler import TranscriptionScheduler
+from PhraseMatcher import phrase_score, sentence_score
+from ForbiddenPhraseRegistry import ForbiddenPhraseRegistry
+from TtsCache import TtsCache, create_tts_backend
+from PlaybackQueue import PRIORITY_ANNOUNCEMENT, PRIORITY_FORBIDDEN
+from MemoryAudioSource import MemoryAudioSource
+from PrisonerStore import PrisonerStore, PrisonerRecord
+from DeadlineScheduler import DeadlineScheduler
+from GuildIndex import GuildIndexCache
+from GuildSession import GuildSessionRegistry, Prisoner
+from PhraseMatcher import get_rapidfuzz
+from Readiness import Readiness
+import Metrics
 import io
 import os
 import os.path
 import threading
+import time
 
 PUNISHMENT_CHANGE_ROLES = True
+ESCAPE_MATCH_THRESHOLD = 80
+# Compared with the whole sentence: the best word window of ordinary speech often scores above it
+ESCAPE_HINT_THRESHOLD = 50
+FORBIDDEN_MATCH_THRESHOLD = 80
+
+DEADLINE_PARDON = "pardon"
+DEADLINE_UNMUTE = "unmute"
+
+COMPONENT_ASR = "speech recognition"
+COMPONENT_MATCHING = "phrase matching"
+COMPONENT_TTS = "speech synthesis"
+
+TTS_SECONDS = Metrics.histogram("prisonbot_tts_seconds", "Time spent getting announcement audio, including cache hits")
+PHRASE_MATCH_SECONDS = Metrics.histogram("prisonbot_phrase_match_seconds", "Time spent matching a transcript against escape and forbidden phrases", (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1))
+DISCORD_API_SECONDS = Metrics.histogram("prisonbot_discord_api_seconds", "Latency of member updates sent to Discord")
+PUNISHMENTS = Metrics.counter("prisonbot_punishments_total", "Members sent to prison")
+PARDONS = Metrics.counter("prisonbot_pardons_total", "Members released from prison")
+FORBIDDEN_DETECTIONS = Metrics.counter("prisonbot_forbidden_phrases_total", "Forbidden phrases detected in prisoners' speech")
+
+recognition_logger = logging.getLogger("prisonbot.recognition")
 
 # channel_disconnect_lock = threading.Lock()
 background_tasks_lock = threading.Lock()
 
+
+class RestoredContext:
+    """Stands in for the command context of a punishment restored after a restart."""
+
+    def __init__(self, guild, channel):
+        self.guild = guild
+        self.channel = channel
+        self.author = guild.me
+
+    @property
+    def voice_client(self):
+        return self.guild.voice_client
+
+    async def send(self, *args, **kwargs):
+        if self.channel:
+            return await self.channel.send(*args, **kwargs)
+
+
 class PunishmentCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.sinks_map = ContextMap()
         self.tts_punish_pattern = self.bot.args.tts_punish_pattern
         self.tts_language = self.bot.args.tts_language
         self.whisper_language = self.bot.args.whisper_language
+        self.asr_model = self.bot.args.asr_model
+        self.keyword_spotting = self.bot.args.asr_keyword_spotting
+        self.asr_worker_processes = []
+        recognizer_factory, max_concurrency = self.create_recognizer_factory()
+        self.recognizer_pool = RecognizerPool.get_default_pool(recognizer_factory, self.asr_model, max_concurrency)
+        self.transcription_scheduler = TranscriptionScheduler(
+            self.recognizer_pool.transcribe_batch,
+            max(self.bot.args.transcription_workers, max_concurrency),
+            self.bot.args.transcription_queue_size,
+            self.bot.args.transcription_batch_size,
+            self.bot.args.transcription_batch_window
+        )
+        self.transcription_scheduler.start()
         self.tts_forbidden_pattern = self.bot.args.tts_forbidden_pattern
         self.admin_roles = self.bot.args.admin_roles if self.bot.args.admin_roles else []
         self.admin_usernames = self.bot.args.admin_usernames if self.bot.args.admin_usernames else []
 
         self.prisoner_role_name = self.bot.args.prisoner_role
         self.prison_channel_name = self.bot.args.prison_channel
-        self.prisoner_role_backup_dict = {}
-        self.prisoner_escape_phrases = {}
-        self.prisoner_nick_backup_dict = {}
-        self.prisoner_channel_backup = {}
+        self.guild_indexes = GuildIndexCache()
+        self.sessions = GuildSessionRegistry(self.bot.loop)
+
+        Metrics.gauge("prisonbot_guild_sessions", "Guilds with prisoners or a voice connection", lambda: len(self.sessions))
+        Metrics.gauge("prisonbot_prisoners", "Members currently in prison", lambda: sum(len(session.prisoners) for session in self.sessions))
+        Metrics.gauge("prisonbot_audio_buffered_bytes", "Audio of unfinished utterances waiting to be transcribed", self.buffered_audio_bytes)
 
         self.background_tasks = []
 
+        self.prisoner_store = PrisonerStore(self.bot.args.state_db)
+        self.prisoner_store.open()
+        self.prisoners_restored = False
+        # Stored prisoners and mutes of guilds that were unavailable at startup, restored once the guild is back
+        self.pending_restores = {}
+        self.pending_unmutes = {}
+
+        self.deadline_scheduler = DeadlineScheduler(self.deadlines_expired)
+        self.discord_api_semaphore = asyncio.Semaphore(self.bot.args.discord_api_concurrency)
+
         if not os.path.exists(self.bot.args.downloads_dir):
             os.makedirs(self.bot.args.downloads_dir)
 
-        self.forbidden_lines = []
+        tts_cache_dir = self.bot.args.tts_cache_dir
+        if tts_cache_dir is None:
+            tts_cache_dir = os.path.join(self.bot.args.downloads_dir, "tts_cache")
+
+        self.tts_cache = TtsCache(
+            create_tts_backend(self.bot.args.tts_backend),
+            tts_cache_dir,
+            self.bot.args.tts_memory_cache_size * 1024 * 1024,
+            self.bot.args.tts_disk_cache_size * 1024 * 1024
+        )
+
+        forbidden_guild_dir = self.bot.args.forbidden_guild_dir
+        if forbidden_guild_dir is None:
+            forbidden_guild_dir = os.path.join(self.bot.args.config_dir, "forbidden_phrases")
+
+        self.forbidden_phrases = ForbiddenPhraseRegistry(self.bot.args.forbidden_path, forbidden_guild_dir)
+        self.forbidden_reload_lock = asyncio.Lock()
+        self.forbidden_watch_task = None
 
         if os.path.exists(self.bot.args.config_dir):
             self.read_config()
 
+        self.readiness = Readiness()
+        for component in (COMPONENT_ASR, COMPONENT_MATCHING, COMPONENT_TTS):
+            self.readiness.register(component)
+
+        if self.bot.args.warmup:
+            self.warm_up()
+
+    def warm_up(self):
+        # Loads run in background threads and are skipped once loading or loaded
+        self.readiness.warm_up(COMPONENT_ASR, self.recognizer_pool.preload)
+        self.readiness.warm_up(COMPONENT_MATCHING, get_rapidfuzz)
+        self.readiness.warm_up(COMPONENT_TTS, self.tts_cache.warm_up)
+
+    def create_recognizer_factory(self):
+        args = self.bot.args
+        addresses = [parse_address(address) for address in args.asr_worker_addresses or []]
+        authkey = args.asr_worker_authkey.encode("utf-8") if addresses else None
+
+        if not addresses and args.asr_workers > 0:
+            settings = RecognizerSettings(args.asr_backend, args.asr_model, args.asr_device, args.asr_compute_type, args.asr_threads, 1, args.warmup)
+            self.asr_worker_processes, addresses, authkey = spawn_local_workers(args.asr_workers, settings)
+
+        if addresses:
+            connections = max(1, args.asr_worker_connections)
+            factory = lambda model_name: RemoteRecognizer(model_name, addresses, authkey, connections)
+            return factory, max(args.asr_max_concurrency, len(addresses) * connections)
+
+        factory = lambda model_name: create_recognizer(args.asr_backend, model_name, args.asr_device, args.asr_compute_type, args.asr_threads)
+        return factory, args.asr_max_concurrency
+
     def read_config(self):
+        logging.info(f"Loading forbidden phrases from '{self.bot.args.forbidden_path}'...")
+        self.forbidden_phrases.load()
+
+    async def reload_forbidden_phrases(self):
+        async with self.forbidden_reload_lock:
+            loop = asyncio.get_running_loop()
+            changes = await loop.run_in_executor(None, self.forbidden_phrases.scan_changes)
+            # Building the matcher of a new guild file takes a while for large lists
+            added, removed = await loop.run_in_executor(None, self.forbidden_phrases.apply_changes, changes)
+
+        if added or removed:
+            for session in self.sessions:
+                self.update_sink(session)
+        return added, removed
+
+    async def watch_forbidden_phrases(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.reload_forbidden_phrases()
+            except Exception as err:
+                logging.error(f"Failed to reload forbidden phrases: {err}")
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        interval = self.bot.args.forbidden_reload_interval
+        if interval > 0 and self.forbidden_watch_task is None:
+            self.forbidden_watch_task = self.bot.loop.create_task(self.watch_forbidden_phrases(interval))
+
+        self.deadline_scheduler.start(self.bot.loop)
+
+        if not self.prisoners_restored:
+            self.prisoners_restored = True
+            await self.restore_prisoners()
+
+    def cog_unload(self):
+        self.deadline_scheduler.stop()
+        self.prisoner_store.close()
+
+        for process in self.asr_worker_processes:
+            process.terminate()
+
+    def save_prisoner(self, ctx, prisoner, pardon_deadline):
+        record = PrisonerRecord(
+            prisoner.member_id,
+            ctx.guild.id,
+            ctx.channel.id if ctx.channel else None,
+            [role.id for role in prisoner.role_backup],
+            prisoner.nick_backup,
+            prisoner.channel_backup.id if prisoner.channel_backup else None,
+            prisoner.escape_phrase,
+            pardon_deadline
+        )
+        self.prisoner_store.put(record)
+
+    def schedule_deadline(self, session, kind, member_id, deadline, payload):
+        key = (kind, session.guild_id, member_id)
+        session.timers.add(key)
+        self.deadline_scheduler.schedule(key, deadline, payload)
+
+    def cancel_deadline(self, session, kind, member_id):
+        key = (kind, session.guild_id, member_id)
+        session.timers.discard(key)
+        self.deadline_scheduler.cancel(key)
+
+    def find_prisoner(self, guild, member_id):
+        session = self.sessions.get(guild.id)
+        return session.prisoners.get(member_id) if session else None
+
+    async def restore_prisoners(self):
+        loop = asyncio.get_running_loop()
+        records = await loop.run_in_executor(None, self.prisoner_store.load_all)
+        mutes = await loop.run_in_executor(None, self.prisoner_store.load_mutes)
+        if not records and not mutes:
+            return
 
-        forbidden_path = self.bot.args.forbidden_path
-        if os.path.exists(forbidden_path):
-            logging.info(f"Loading forbidden phrases from '{forbidden_path}'...")
-            with open(forbidden_path, "r", encoding="utf-8") as fin:
-                lines = fin.readlines()
+        logging.info(f"Restoring {len(records)} prisoners and {len(mutes)} mutes...")
+        if records:
+            self.warm_up()
 
-            for line in lines:
-                line_strip = line.strip()
-                self.forbidden_lines.append(line_strip)
-                logging.debug(f"Forbidden line '{line_strip}' registered")
-        else:
-            logging.error(f"File {forbidden_path} not found!")
-    
-    @commands.command()
-    async def punish(self, ctx: commands.Context, username, escape_phrase, auto_pardon_time):
+        for record in records:
+            self.pending_restores.setdefault(record.guild_id, []).append(record)
+        for guild_id, member_id, unmute_deadline in mutes:
+            self.pending_unmutes.setdefault(guild_id, []).append((member_id, unmute_deadline))
 
-        logging.info(f"Punish({username}, {escape_phrase}, {auto_pardon_time}) command issued by {ctx.author.name}")
+        for guild_id in set(self.pending_restores) | set(self.pending_unmutes):
+            guild = self.bot.get_guild(guild_id)
+            if guild is None or guild.unavailable:
+                # Records are only forgotten once the member is known to be gone
+                logging.warning(f"Guild {guild_id} is unavailable, its prisoners are restored when it comes back")
+                continue
+            await self.restore_guild_prisoners(guild)
+
+    async def find_restored_member(self, guild, member_id):
+        """Returns the member, or None if they left the guild."""
+        member = guild.get_member(member_id)
+        if member:
+            return member
+
+        try:
+            return await guild.fetch_member(member_id)
+        except discord.NotFound:
+            return None
+
+    async def restore_guild_prisoners(self, guild):
+        await self.restore_guild_mutes(guild)
+
+        records = self.pending_restores.pop(guild.id, [])
+        recording_ctx = None
+
+        for record in records:
+            try:
+                member = await self.find_restored_member(guild, record.member_id)
+            except Exception as err:
+                logging.error(f"Failed to look up prisoner {record.member_id} of {guild.name}, retrying when the guild is available again: {err}")
+                self.pending_restores.setdefault(guild.id, []).append(record)
+                continue
+
+            if not member:
+                logging.warning(f"Prisoner {record.member_id} left {guild.name}, forgetting them")
+                self.prisoner_store.remove(record.guild_id, record.member_id)
+                continue
+
+            ctx = RestoredContext(guild, guild.get_channel(record.text_channel_id))
+            session = self.sessions.get_or_create(guild.id)
+
+            roles = [guild.get_role(role_id) for role_id in record.role_ids]
+            session.prisoners[member.id] = Prisoner(
+                member.id,
+                [role for role in roles if role],
+                record.nick,
+                guild.get_channel(record.voice_channel_id) if record.voice_channel_id else None,
+                record.escape_phrase
+            )
+
+            if record.escape_phrase and recording_ctx is None:
+                recording_ctx = ctx
+
+            if record.pardon_deadline is not None:
+                self.schedule_deadline(session, DEADLINE_PARDON, member.id, record.pardon_deadline, ctx)
+
+        if recording_ctx is None:
+            return
 
-        has_rights = False
+        prison_channel = self.find_channel_by_name(recording_ctx, self.prison_channel_name)
+        if not prison_channel:
+            logging.error(f"Prison channel {self.prison_channel_name} not found in {guild.name}")
+            return
+
+        try:
+            if not recording_ctx.voice_client:
+                await prison_channel.connect()
+            self.start_recording(recording_ctx)
+        except Exception as err:
+            logging.error(f"Failed to resume recording in {guild.name}: {err}")
+
+    async def restore_guild_mutes(self, guild):
+        # Expired mutes are lifted by the deadline scheduler right away
+        for member_id, unmute_deadline in self.pending_unmutes.pop(guild.id, []):
+            try:
+                member = await self.find_restored_member(guild, member_id)
+            except Exception as err:
+                logging.error(f"Failed to look up muted member {member_id} of {guild.name}, retrying when the guild is available again: {err}")
+                self.pending_unmutes.setdefault(guild.id, []).append((member_id, unmute_deadline))
+                continue
+
+            if not member:
+                self.prisoner_store.remove_mute(guild.id, member_id)
+                continue
+
+            session = self.sessions.get_or_create(guild.id)
+            self.schedule_deadline(session, DEADLINE_UNMUTE, member.id, unmute_deadline, member)
+
+    async def check_admin_rights(self, ctx: commands.Context):
         author = ctx.author
 
         if not isinstance(author, discord.Member):
             await ctx.send("Can only be used on a Server!")
-            return
+            return False
 
-        author_roles = author.roles
+        if author.name in self.admin_usernames:
+            return True
 
-        for author_role in author_roles:
+        for author_role in author.roles:
             if author_role.name in self.admin_roles:
-                has_rights = True
-                break
+                return True
 
-        if author.name in self.admin_usernames:
-            has_rights = True
+        await ctx.send("You don't have permition to use this command!")
+        return False
+
+    def buffered_audio_bytes(self):
+        return sum(session.sink.buffered_bytes() for session in self.sessions if session.sink is not None)
+
+    @commands.command()
+    async def metrics(self, ctx: commands.Context):
+        if not await self.check_admin_rights(ctx):
+            return
 
-        if not has_rights:
-            await ctx.send("You don't have permition to use this command!")
+        if not Metrics.REGISTRY.enabled:
+            await ctx.send("Metrics are disabled!")
             return
 
-        auto_pardon_time = float(auto_pardon_time)
+        summary = Metrics.REGISTRY.summary()
+        if len(summary) > 1900:
+            summary = summary[:1900] + "\n..."
+        await ctx.send(f"```\n{summary}\n```")
+
+    @commands.command()
+    async def reload_phrases(self, ctx: commands.Context):
+        if not await self.check_admin_rights(ctx):
+            return
 
-        member = ctx.guild.get_member_named(username)
+        added, removed = await self.reload_forbidden_phrases()
+        await ctx.send(f"Forbidden phrases reloaded: {added} added, {removed} removed")
+
+    @commands.command()
+    async def punish(self, ctx: commands.Context, username, escape_phrase, auto_pardon_time):
+
+        logging.info(f"Punish({username}, {escape_phrase}, {auto_pardon_time}) command issued by {ctx.author.name}")
+
+        if not await self.check_admin_rights(ctx):
+            return
+
+        member = self.find_member_by_name(ctx, username)
 
         if not member:
             await ctx.send(f"Member with name {username} not found!")
             return
 
-        prison_channel = self.find_channel_by_name(ctx, self.prison_channel_name)
-        
-        self.prisoner_role_backup_dict[member.id] = member.roles
+        await self.punish_members(ctx, [member], escape_phrase, float(auto_pardon_time))
 
-        if member.voice:
-           self.prisoner_channel_backup[member.id] = member.voice.channel
-        else:
-           self.prisoner_channel_backup[member.id] = None
+    @commands.command()
+    async def mass_punish(self, ctx: commands.Context, escape_phrase, auto_pardon_time, *, usernames):
+        """Punishes several comma-separated members at once."""
+
+        logging.info(f"MassPunish({usernames}, {escape_phrase}, {auto_pardon_time}) command issued by {ctx.author.name}")
 
-        await member.move_to(prison_channel)
+        if not await self.check_admin_rights(ctx):
+            return
+
+        members = await self.find_members(ctx, usernames)
+        if members:
+            await self.punish_members(ctx, members, escape_phrase, float(auto_pardon_time))
+
+    async def find_members(self, ctx: commands.Context, usernames):
+        members = []
+        for username in usernames.split(","):
+            username = username.strip()
+            if not username:
+                continue
+
+            member = self.find_member_by_name(ctx, username)
+            if not member:
+                await ctx.send(f"Member with name {username} not found!")
+                return []
+            members.append(member)
+        return members
+
+    async def run_member_operations(self, operations):
+        async def run_bounded(operation):
+            async with self.discord_api_semaphore:
+                with DISCORD_API_SECONDS.time():
+                    return await operation
+
+        return await asyncio.gather(*[run_bounded(operation) for operation in operations])
+
+    async def imprison_member(self, ctx: commands.Context, member, prison_channel, prisoner_role):
+        nick = self.bot.args.punish_nick_pattern.format(member.name)
+        changes = {"nick": nick}
 
         if PUNISHMENT_CHANGE_ROLES:
-            prisoner_role = self.find_role_by_name(ctx, self.prisoner_role_name)
+            changes["roles"] = [prisoner_role]
 
-            try:
-                await member.edit(roles = [prisoner_role])
-            except Exception as err:
-                logging.error(f"Exception occured during member.edit: {err}")
-                await ctx.send(f"Cannot set role {prisoner_role.name} for {member.name}. Reason: {err}")
+        if member.voice:
+            changes["voice_channel"] = prison_channel
+
+        err = await self.edit_member(member, changes)
+        if err:
+            return f"Cannot imprison {member.name}. Reason: {err}"
+
+        logging.info(f"{member.name} imprisoned with {changes}")
+        return None
+
+    async def edit_member(self, member, changes):
+        """Applies changes to a member, retrying without the nickname if that fails.
+
+        Returns None on success, otherwise the error of the last attempt.
+        """
+        try:
+            await member.edit(**changes)
+            return None
+        except Exception as err:
+            logging.error(f"Failed to edit {member.name}: {err}")
+            if "nick" not in changes:
+                return err
+
+        # Changing the nickname fails for members ranked above the bot
+        changes = {key: value for key, value in changes.items() if key != "nick"}
+        if not changes:
+            return None
+
+        try:
+            await member.edit(**changes)
+            return None
+        except Exception as err:
+            logging.error(f"Failed to edit {member.name} without the nickname: {err}")
+            return err
+
+    async def punish_members(self, ctx: commands.Context, members, escape_phrase, auto_pardon_time):
+        prison_channel = self.find_channel_by_name(ctx, self.prison_channel_name)
+        prisoner_role = self.find_role_by_name(ctx, self.prisoner_role_name)
+
+        if not prison_channel:
+            await ctx.send(f"Prison channel {self.prison_channel_name} not found!")
+            return
+
+        if PUNISHMENT_CHANGE_ROLES and not prisoner_role:
+            await ctx.send(f"Prisoner role {self.prisoner_role_name} not found!")
+            return
+
+        self.warm_up()
+
+        session = self.sessions.get_or_create(ctx.guild.id)
+        prisoners = []
+        for member in members:
+            # A member punished again already wears the prison roles and nick,
+            # so their backup is kept and only the escape phrase and deadline change
+            prisoner = session.prisoners.get(member.id)
+            if prisoner is None:
+                prisoner = Prisoner(member.id, member.roles, member.nick, member.voice.channel if member.voice else None)
+                session.prisoners[member.id] = prisoner
+            prisoners.append(prisoner)
+
+        errors = await self.run_member_operations([self.imprison_member(ctx, member, prison_channel, prisoner_role) for member in members])
 
         if ctx.voice_client:
             await ctx.voice_client.move_to(prison_channel)
         else:
             await prison_channel.connect()
+        session.voice_client = ctx.voice_client
 
-        try:
-            self.prisoner_nick_backup_dict[member.id] = member.nick
-            nick = self.bot.args.punish_nick_pattern.format(member.name)
-            await member.edit(nick=nick)
-            logging.info(f"{member.name} nickname changed to {nick}")
-        except Exception as err:
-            logging.error(f"Failed to set {member.name} nick to {nick}: {err}")
-        
-        message = f"{member.name} sent to {prison_channel.name} for bad behavior!"
+        names = ", ".join([member.name for member in members])
+        message = f"{names} sent to {prison_channel.name} for bad behavior!"
+
+        pardon_deadline = None
 
         if escape_phrase:
-            message += f"\n{member.name} can say '{escape_phrase}' to escape the prison!"
-            self.prisoner_escape_phrases[member.id] = escape_phrase
+            message += f"\n{names} can say '{escape_phrase}' to escape the prison!"
 
         if auto_pardon_time:
-            message += f"\n{member.name} will be automatically released in {auto_pardon_time} seconds."
+            message += f"\n{names} will be automatically released in {auto_pardon_time} seconds."
+            pardon_deadline = time.time() + auto_pardon_time
+
+        PUNISHMENTS.inc(len(prisoners))
+        for prisoner in prisoners:
+            if escape_phrase:
+                prisoner.escape_phrase = escape_phrase
+            if pardon_deadline is not None:
+                self.schedule_deadline(session, DEADLINE_PARDON, prisoner.member_id, pardon_deadline, ctx)
+                self.save_prisoner(ctx, prisoner, pardon_deadline)
+            else:
+                # A prisoner punished again without a timeout keeps their earlier deadline
+                self.save_prisoner(ctx, prisoner, self.deadline_scheduler.deadline((DEADLINE_PARDON, session.guild_id, prisoner.member_id)))
+        self.update_sink(session)
 
-            loop = asyncio.get_event_loop()
-            task = loop.create_task(self.pardon_after(ctx, auto_pardon_time, [member]))
-            task.add_done_callback(self.remove_background_task)
+        for error in errors:
+            if error:
+                message += f"\n{error}"
+
+        loading = self.readiness.loading()
+        if loading:
+            message += "\nStill loading: " + ", ".join(loading)
+        for component, error in self.readiness.failed().items():
+            message += f"\nFailed to load {component}: {error}"
 
         await ctx.send(message)
 
         def start_recoring(announcement_error):
+            # Prisoners must be able to escape even if the announcement could not be played
             if announcement_error:
                 logging.error(f"Announcement playback error: {announcement_error}")
-                return
 
-            if ctx not in self.sinks_map:
-                sink = SpeechRecognitionSink(self.bot, ctx, self.text_recognition_callback, self.whisper_language)
-                self.sinks_map[ctx] = sink
-                ctx.voice_client.start_recording(sink, self.recording_stopped_callback, ctx)
-                logging.info(f"Recording started in server: {ctx.guild.name}, channel: {ctx.voice_client.channel.name}")
+            self.start_recording(ctx)
+
+        await self.announce_punishment(ctx, names, escape_phrase, start_recoring)
 
-        await self.announce_punishment(ctx, member, escape_phrase, start_recoring)
+    def start_recording(self, ctx):
+        if not ctx.voice_client:
+            logging.error(f"Cannot start recording in server {ctx.guild.name}: not connected to a voice channel")
+            return
+
+        session = self.sessions.get_or_create(ctx.guild.id)
+        if session.sink is None:
+            sink = SpeechRecognitionSink(
+                self.bot,
+                ctx,
+                self.text_recognition_callback,
+                self.whisper_language,
+                self.transcription_scheduler,
+                model_name=self.asr_model,
+                filters={"users": set()},
+                partial_interval=self.bot.args.asr_partial_interval if self.bot.args.asr_streaming else None
+            )
+            session.sink = sink
+            session.voice_client = ctx.voice_client
+            self.update_sink(session)
+            ctx.voice_client.start_recording(sink, self.recording_stopped_callback, ctx)
+            logging.info(f"Recording started in server: {ctx.guild.name}, channel: {ctx.voice_client.channel.name}")
+
+    def update_sink(self, session):
+        sink = session.sink
+        if sink is None:
+            return
 
+        # Only prisoners with an escape phrase are listened to. The set is
+        # shared with the decoder thread, so it is changed in place.
+        admitted = {member_id for member_id, prisoner in session.prisoners.items() if prisoner.escape_phrase}
+        # Users leave the set before their state is dropped, so a packet
+        # arriving in between cannot bring it back
+        removed = sink.admitted_users - admitted
+        sink.admitted_users.intersection_update(admitted)
+        for user in removed:
+            sink.forget_user(user)
+        sink.admitted_users.update(admitted)
+
+        # In keyword spotting mode recognition is primed with the phrases that matter in this guild
+        if self.keyword_spotting:
+            forbidden = self.forbidden_phrases.matcher_for(session.guild_id).phrase_list()
+            escape = sorted({prisoner.escape_phrase for prisoner in session.prisoners.values() if prisoner.escape_phrase})
+            keywords = tuple(forbidden + escape)
+            sink.keywords = keywords if keywords else None
 
     def remove_background_task(self, task):
         with background_tasks_lock:
@@ -169,23 +613,83 @@ class PunishmentCog(commands.Cog):
         logging.info(f"Stopped recording for sink {sink} in {ctx.guild.name}")
         
 
-    async def pardon_after(self, ctx, delay, members):
-        await asyncio.sleep(delay)
-        logging.info("Auto-pardon timeout")
+    async def deadlines_expired(self, expired):
+        pardons = {}
+        unmutes = []
 
-        message = "Prison time of "
+        for (kind, guild_id, member_id), payload in expired:
+            session = self.sessions.get(guild_id)
+            if session:
+                session.timers.discard((kind, guild_id, member_id))
 
-        message += ", ".join([member.name for member in members]) + " ended!"
+            if kind == DEADLINE_PARDON:
+                ctx = payload
+                member = ctx.guild.get_member(member_id)
+                if member:
+                    pardons.setdefault(ctx.guild.id, (ctx, []))[1].append(member)
+            elif kind == DEADLINE_UNMUTE:
+                unmutes.append(payload)
 
-        await ctx.send(message)
-        await self.pardon_internal(ctx, members)
+        for member in unmutes:
+            await self.unmute(member)
+            self.prisoner_store.remove_mute(member.guild.id, member.id)
+            self.sessions.discard_if_idle(member.guild.id)
+
+        for ctx, members in pardons.values():
+            logging.info("Auto-pardon timeout")
+
+            message = "Prison time of "
+
+            message += ", ".join([member.name for member in members]) + " ended!"
+
+            await ctx.send(message)
+            await self.pardon_internal(ctx, members)
+
+    async def change_sentence(self, ctx: commands.Context, username, seconds, extend):
+        if not await self.check_admin_rights(ctx):
+            return
+
+        member = self.find_member_by_name(ctx, username)
+        prisoner = self.find_prisoner(ctx.guild, member.id) if member else None
+        if not prisoner:
+            await ctx.send(f"Prisoner with name {username} not found!")
+            return
+
+        session = self.sessions.get(ctx.guild.id)
+        seconds = float(seconds)
+        key = (DEADLINE_PARDON, session.guild_id, member.id)
+        pardon_deadline = self.deadline_scheduler.deadline(key)
+
+        if extend and pardon_deadline is not None:
+            pardon_deadline = self.deadline_scheduler.extend(key, seconds)
+        elif extend or seconds > 0:
+            pardon_deadline = time.time() + seconds
+            self.schedule_deadline(session, DEADLINE_PARDON, member.id, pardon_deadline, ctx)
+        else:
+            self.cancel_deadline(session, DEADLINE_PARDON, member.id)
+            pardon_deadline = None
+
+        self.save_prisoner(ctx, prisoner, pardon_deadline)
+
+        if pardon_deadline is None:
+            await ctx.send(f"{member.name} will not be released automatically.")
+        else:
+            await ctx.send(f"{member.name} will be automatically released in {max(0, pardon_deadline - time.time()):.0f} seconds.")
 
+    @commands.command()
+    async def extend(self, ctx: commands.Context, username, seconds):
+        await self.change_sentence(ctx, username, seconds, True)
+
+    @commands.command()
+    async def sentence(self, ctx: commands.Context, username, seconds):
+        await self.change_sentence(ctx, username, seconds, False)
 
-    async def text_recognition_callback_async(self, sink, user, text):
+    async def text_recognition_callback_async(self, sink, user, text, utterance_id=None, partial=False):
         ctx = sink.ctx
 
-        if user not in self.prisoner_escape_phrases:
-            logging.info(f"[Text recognition]: {user} ignored due to not having an escape phrase")
+        prisoner = self.find_prisoner(ctx.guild, user)
+        if not prisoner or not prisoner.escape_phrase:
+            recognition_logger.debug(f"[Text recognition]: {user} ignored due to not having an escape phrase")
             return
 
         text = text.strip()
@@ -193,127 +697,232 @@ class PunishmentCog(commands.Cog):
         member: discord.Member = ctx.guild.get_member(user)
 
         if not text:
-            logging.info(f"[Text recognition] {member.name}: <empty string>")
+            recognition_logger.debug(f"[Text recognition] {member.name}: <empty string>")
             return
 
-        escape_phrase = self.prisoner_escape_phrases[user]
+        escape_phrase = prisoner.escape_phrase
 
-        logging.info(f"[Text recognition] {member.name}: {text}")
+        if partial:
+            recognition_logger.debug(f"[Text recognition] {member.name} (partial): {text}")
+        else:
+            recognition_logger.info(f"[Text recognition] {member.name}: {text}")
 
-        text = text.replace(",", ".")
-        text = text.replace("!", ".")
-        text = text.replace("?", ".")
+        loop = asyncio.get_running_loop()
+        ratio_escape, said_escape, forbidden_match = await loop.run_in_executor(None, self.match_phrases, ctx.guild.id, text, escape_phrase)
 
-        sentences = [sentence.strip() for sentence in text.split(".")]
+        if self.find_prisoner(ctx.guild, user) is not prisoner:
+            # Pardoned while the phrases were matched
+            return
 
-        sentences.append(text)
+        escaped = ratio_escape >= ESCAPE_MATCH_THRESHOLD
+        if escaped and not prisoner.first_detection(utterance_id, escape_phrase):
+            # An earlier result of this utterance is already releasing the prisoner
+            return
 
-        logging.info(f"[Text recognition] {member.name} sentences: {sentences}")
+        if escaped:
+            await ctx.send(f"Prisoner {member.name} said '{said_escape}', which is {ratio_escape}% close to {escape_phrase}!")
+            await self.pardon_internal(ctx, [member])
+            return
 
-        for sentence in sentences:
-            ratio_escape = fuzz.ratio(sentence, escape_phrase)
-            if ratio_escape >= 80:
-                await ctx.send(f"Prisoner {member.name} said '{sentence}', which is {ratio_escape}% close to {escape_phrase}!")
-                await self.pardon_internal(ctx, [member])
-                break
+        # Partial results only act on matches, hints wait for the final result
+        if not partial:
+            ratio_sentence = sentence_score(text, escape_phrase)
+            if ratio_sentence >= ESCAPE_HINT_THRESHOLD:
+                await ctx.send(f"Prisoner {member.name} said '{text}', which is {ratio_sentence}% close to {escape_phrase}!")
 
-            elif ratio_escape >= 50:
-                await ctx.send(f"Prisoner {member.name} said '{sentence}', which is {ratio_escape}% close to {escape_phrase}!")
+        if forbidden_match and prisoner.first_detection(utterance_id, forbidden_match.phrase):
+            FORBIDDEN_DETECTIONS.inc()
+            logging.info(f"Forbidden line {forbidden_match.phrase} detected in {member.name}'s voice")
+            await ctx.send(f"Prisoner {member.name} said '{forbidden_match.matched_text}', which is {forbidden_match.score}% close to forbidden {forbidden_match.phrase}!")
 
-            for forbidden_line in self.forbidden_lines:
-                ratio_forbidden = fuzz.ratio(sentence, forbidden_line)
-                if ratio_forbidden >= 80:
-                    logging.info(f"Forbidden line {forbidden_line} detected in {member.name}'s voice")
-                    await ctx.send(f"Prisoner {member.name} said '{sentence}', which is {ratio_forbidden}% close to forbidden {forbidden_line}!")
+            tts_text = self.tts_forbidden_pattern.format(member.name)
 
-                    tts_text = self.tts_forbidden_pattern.format(member.name)
+            await self.play_tts(ctx, tts_text, lambda e: self.forbidden_tts_callback(e, member), PRIORITY_FORBIDDEN)
+            # await member.edit(mute=True)
 
-                    await self.play_tts(ctx, f"{member.id}-forbidden", tts_text, lambda e: self.forbidden_tts_callback(e, member))
-                    # await member.edit(mute=True)
-                    
-                    break
+    def match_phrases(self, guild_id, text, escape_phrase):
+        # Runs in an executor, a long utterance against a large phrase list takes milliseconds
+        with PHRASE_MATCH_SECONDS.time():
+            ratio_escape, said_escape = phrase_score(text, escape_phrase)
+            forbidden_match = None
+            if ratio_escape < ESCAPE_MATCH_THRESHOLD:
+                forbidden_match = self.forbidden_phrases.matcher_for(guild_id).best_match(text, FORBIDDEN_MATCH_THRESHOLD)
+        return ratio_escape, said_escape, forbidden_match
 
-    async def mute_until_time(self, member, time):
+    async def mute_until_time(self, member, unmute_time):
         try:
-            # await member.edit(communication_disabled_until=time)
             await member.edit(mute=True)
-            logging.info(f"Member {member.name} is muted until {time.timestamp()}")
+            session = self.sessions.get_or_create(member.guild.id)
+            self.schedule_deadline(session, DEADLINE_UNMUTE, member.id, unmute_time, member)
+            # Stored, so a restart during the mute does not leave the member muted for good
+            self.prisoner_store.put_mute(member.guild.id, member.id, unmute_time)
+            logging.info(f"Member {member.name} is muted until {unmute_time}")
         except Exception as err:
             logging.error(f"Failed to mute {member.name}: {err}")
 
+    async def unmute(self, member):
+        try:
+            await member.edit(mute=False)
+            logging.info(f"Member {member.name} is unmuted")
+        except Exception as err:
+            logging.error(f"Failed to unmute {member.name}: {err}")
+
     def forbidden_tts_callback(self, e, member):
         logging.info("Forbidden tts finished")
         if e:
             logging.error(f"Forbidden TTSp layback error: {e}")
         duration = self.bot.args.forbidden_mute_duration
-        mute_until = datetime.now() + timedelta(seconds=duration)
+        mute_until = time.time() + duration
         task = self.bot.loop.create_task(self.mute_until_time(member, mute_until))
         self.add_background_task(task)
         task.add_done_callback(self.remove_background_task)
 
-    def text_recognition_callback(self, sink, user, text):
-        asyncio.run_coroutine_threadsafe(self.text_recognition_callback_async(sink, user, text), self.bot.loop)
+    def text_recognition_callback(self, sink, user, text, utterance_id=None, partial=False):
+        asyncio.run_coroutine_threadsafe(self.text_recognition_callback_async(sink, user, text, utterance_id, partial), self.bot.loop)
         # task = self.bot.loop.create_task(self.text_recognition_callback_async(sink, user, text))
         # self.add_background_task(task)
         # task.add_done_callback(self.remove_background_task)
         
 
     def find_role_by_id(self, ctx: commands.Context, role_id):
-        for role in ctx.guild.roles:
-            if role.id == role_id:
-                return role
-        return None
+        return self.guild_indexes.get(ctx.guild).role_by_id(role_id)
 
     def find_role_by_name(self, ctx: commands.Context, role_name):
-        for role in ctx.guild.roles:
-            if role.name == role_name:
-                return role
-        return None
+        return self.guild_indexes.get(ctx.guild).role_by_name(role_name)
 
     def find_channel_by_name(self, ctx: commands.Context, channel_name):
-        for channel in ctx.guild.channels:
-            if channel.name == channel_name:
-                return channel
-        return channel
-    
-    async def pardon_internal(self, ctx: commands.Context, members: list[discord.Member]):
-        prison_channel = self.find_channel_by_name(ctx, self.prison_channel_name)
-        prisoner_role = self.find_role_by_name(ctx, self.prisoner_role_name)
-        for member in members:
+        return self.guild_indexes.get(ctx.guild).channel_by_name(channel_name)
+
+    def find_member_by_name(self, ctx: commands.Context, name):
+        return self.guild_indexes.get(ctx.guild).member_by_name(name)
+
+    @commands.Cog.listener()
+    async def on_guild_role_create(self, role):
+        self.guild_indexes.invalidate(role.guild, roles=True)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role):
+        self.guild_indexes.invalidate(role.guild, roles=True)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before, after):
+        self.guild_indexes.invalidate(after.guild, roles=True)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_create(self, channel):
+        self.guild_indexes.invalidate(channel.guild, channels=True)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel):
+        self.guild_indexes.invalidate(channel.guild, channels=True)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_update(self, before, after):
+        if before.name != after.name:
+            self.guild_indexes.invalidate(after.guild, channels=True)
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member):
+        self.guild_indexes.invalidate(member.guild, members=True)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member):
+        self.guild_indexes.invalidate(member.guild, members=True)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before, after):
+        if before.nick != after.nick:
+            self.guild_indexes.invalidate(after.guild, members=True)
+
+    @commands.Cog.listener()
+    async def on_user_update(self, before, after):
+        if before.name != after.name or before.global_name != after.global_name or before.discriminator != after.discriminator:
+            for guild in after.mutual_guilds:
+                self.guild_indexes.invalidate(guild, members=True)
+
+    @commands.Cog.listener()
+    async def on_guild_available(self, guild):
+        if guild.id in self.pending_restores or guild.id in self.pending_unmutes:
+            logging.info(f"{guild.name} is available again, restoring its prisoners")
+            await self.restore_guild_prisoners(guild)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        self.guild_indexes.remove(guild)
+        self.pending_restores.pop(guild.id, None)
+        self.pending_unmutes.pop(guild.id, None)
+
+        session = self.sessions.get(guild.id)
+        if session is None:
+            return
 
-            current_roles = member.roles
-            if PUNISHMENT_CHANGE_ROLES and prisoner_role in current_roles and member.id in self.prisoner_role_backup_dict:
-                roles = self.prisoner_role_backup_dict[member.id]
-                del self.prisoner_role_backup_dict[member.id]
-                await member.edit(roles = roles)
-                logging.info(f"Roles of {member.name} restored to {roles}")
-
-            if member.voice and member.voice.channel.id == prison_channel.id:
-                if member.id in self.prisoner_channel_backup and self.prisoner_channel_backup[member.id]:
-                    await member.move_to(self.prisoner_channel_backup[member.id])
-                    logging.info(f"Member moved to channel {self.prisoner_channel_backup[member.id]}")
-                else:
-                    await member.move_to(ctx.author.voice.channel)
-                    logging.info(f"Member moved to channel {ctx.author.voice.channel}")
-
-                if member.id in self.prisoner_channel_backup:
-                    del self.prisoner_channel_backup[member.id]
-            else:
-                logging.info(f"Member is not in {prison_channel.name}, they will not be moved to {ctx.author.voice.channel}")
+        for kind, _, member_id in list(session.timers):
+            self.cancel_deadline(session, kind, member_id)
+            if kind == DEADLINE_UNMUTE:
+                self.prisoner_store.remove_mute(guild.id, member_id)
+        # The bot can no longer give their roles back, restore_prisoners would forget them as well
+        for member_id in session.prisoners:
+            self.prisoner_store.remove(guild.id, member_id)
 
-            if member.id in self.prisoner_escape_phrases:
-                del self.prisoner_escape_phrases[member.id]
+        logging.info(f"Removed from {guild.name}, dropping its session with {len(session.prisoners)} prisoners")
+        self.sessions.teardown(guild.id)
 
-            try:
-                if member.id in self.prisoner_nick_backup_dict:
-                    nick = self.prisoner_nick_backup_dict[member.id]
-                    await member.edit(nick=nick)
-                    del self.prisoner_nick_backup_dict[member.id]
-                    logging.info(f"{member.name} nickname restored to {nick}")
-            except Exception as err:
-                logging.error(f"Failed to restore nickname for {member.name}: {err}")
+    async def release_member(self, ctx: commands.Context, member, prisoner, prison_channel, prisoner_role, fallback_channel):
+        changes = {}
+
+        if PUNISHMENT_CHANGE_ROLES and prisoner and prisoner_role in member.roles:
+            changes["roles"] = prisoner.role_backup
+
+        if prison_channel and member.voice and member.voice.channel.id == prison_channel.id:
+            if prisoner and prisoner.channel_backup:
+                changes["voice_channel"] = prisoner.channel_backup
+            elif fallback_channel:
+                changes["voice_channel"] = fallback_channel
+        else:
+            logging.info(f"Member is not in {self.prison_channel_name}, they will not be moved to {fallback_channel}")
+
+        if prisoner:
+            changes["nick"] = prisoner.nick_backup
 
-            await ctx.send(f"Pardoned user {member.name}")
+        if not changes:
+            return None
+
+        err = await self.edit_member(member, changes)
+        if err:
+            return f"Failed to restore {member.name}. Reason: {err}"
+
+        logging.info(f"{member.name} released with {changes}")
+        return None
+
+    async def pardon_internal(self, ctx: commands.Context, members: list[discord.Member]):
+        prison_channel = self.find_channel_by_name(ctx, self.prison_channel_name)
+        prisoner_role = self.find_role_by_name(ctx, self.prisoner_role_name)
+        fallback_channel = ctx.author.voice.channel if ctx.author.voice else None
+        session = self.sessions.get_or_create(ctx.guild.id)
+
+        prisoners = []
+        for member in members:
+            prisoners.append(session.prisoners.pop(member.id, None))
+            self.prisoner_store.remove(ctx.guild.id, member.id)
+            self.cancel_deadline(session, DEADLINE_PARDON, member.id)
+        self.update_sink(session)
+
+        PARDONS.inc(len(members))
+        errors = await self.run_member_operations([
+            self.release_member(ctx, member, prisoner, prison_channel, prisoner_role, fallback_channel)
+            for member, prisoner in zip(members, prisoners)
+        ])
+
+        if members:
+            message = "Pardoned " + ", ".join([member.name for member in members])
+            for error in errors:
+                if error:
+                    message += f"\n{error}"
+            await ctx.send(message)
+
+        if not prison_channel:
+            logging.error(f"Prison channel {self.prison_channel_name} not found in {ctx.guild.name}")
+            return
 
         prisoners_in_channel_num = 0
 
@@ -321,13 +930,16 @@ class PunishmentCog(commands.Cog):
             if prisoner_role in member.roles:
                 prisoners_in_channel_num += 1
                 continue
-            if member.id in self.prisoner_escape_phrases:
+            if member.id in session.prisoners:
                 prisoners_in_channel_num += 1
                 continue
 
         if prisoners_in_channel_num == 0:
             logging.info(f"Nobody is in prison channel {prison_channel.name}. Disconnecting.")
 
+            session.stop_voice()
+            self.sessions.discard_if_idle(ctx.guild.id)
+
             try:
                 if not ctx.voice_client:
                     return
@@ -336,7 +948,6 @@ class PunishmentCog(commands.Cog):
                 #     ctx.voice_client.stop_recording()
 
                 await ctx.voice_client.disconnect()
-                del self.sinks_map[ctx]
             except Exception as err:
                 logging.error(f"Failed to disconnect from channel {prison_channel.name}. Error: {err}")
 
@@ -345,43 +956,56 @@ class PunishmentCog(commands.Cog):
 
     
     @commands.command()
-    async def pardon(self, ctx: commands.Context, *, username):
+    async def pardon(self, ctx: commands.Context, *, usernames=None):
+        """Pardons comma-separated members, or every prisoner of the server if none are given."""
 
-        members_to_pardon = []
-        if username:
-            member = ctx.guild.get_member_named(username)
-            if not member:
-                await ctx.send(f"Member with name {username} not found!")
+        if usernames:
+            members_to_pardon = await self.find_members(ctx, usernames)
+            if not members_to_pardon:
                 return
-            members_to_pardon.append(member)
         else:
-            for prisoner_id in self.prisoner_role_backup_dict.items():
+            members_to_pardon = []
+            session = self.sessions.get(ctx.guild.id)
+            for prisoner_id in list(session.prisoners) if session else []:
                 member = ctx.guild.get_member(prisoner_id)
-                members_to_pardon.append(member)
-        
+                if member:
+                    members_to_pardon.append(member)
+
         await self.pardon_internal(ctx, members_to_pardon)
 
-    async def play_tts(self, ctx: commands.Context, filename, text, playback_finished_callback):
+    async def play_tts(self, ctx: commands.Context, text, playback_finished_callback, priority=PRIORITY_ANNOUNCEMENT):
         logging.info(f"[TTS]: {text}")
 
-        gtts = gTTS(text=text, lang=self.tts_language, slow=False)
-        
-        tts_file = f"{self.bot.args.downloads_dir}/{str(filename)}.mp3"
-        gtts.save(tts_file)
-        
-        audio_source = discord.FFmpegPCMAudio(tts_file)
+        # The callback runs on every path, callers such as punish_members continue from it
+        try:
+            with TTS_SECONDS.time():
+                tts_pcm = await self.tts_cache.get_pcm(text, self.tts_language)
+        except Exception as err:
+            logging.error(f"TTS generation failed, using Discord's TTS instead: {err}")
+            await ctx.send(text, tts=True)
+            playback_finished_callback(err)
+            return
 
-        if not ctx.voice_client.is_playing():
-            ctx.voice_client.play(audio_source, after=playback_finished_callback)
-        else:
-            logging.error("Already playing sound, using Discord's TTS instead")
+        if not ctx.voice_client:
+            logging.error("Not connected to a voice channel, using Discord's TTS instead")
             await ctx.send(text, tts=True)
+            playback_finished_callback(ConnectionError("Not connected to a voice channel"))
+            return
+
+        session = self.sessions.get_or_create(ctx.guild.id)
+        session.playback_queue.enqueue(
+            ctx.voice_client,
+            text,
+            lambda: MemoryAudioSource(tts_pcm),
+            playback_finished_callback,
+            priority
+        )
 
-    async def announce_punishment(self, ctx: commands.Context, member, escape_phrase, playback_finished_callback):
+    async def announce_punishment(self, ctx: commands.Context, names, escape_phrase, playback_finished_callback):
 
-        text = self.tts_punish_pattern.format(member.name, escape_phrase)
+        text = self.tts_punish_pattern.format(names, escape_phrase)
 
-        await self.play_tts(ctx, f"{member.id}-announcement", text, playback_finished_callback)
+        await self.play_tts(ctx, text, playback_finished_callback)
 
 
 
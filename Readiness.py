@@ -0,0 +1,61 @@
+import logging
+import threading
+import time
+
+
+NOT_LOADED = "not loaded"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+class Readiness:
+    """Load state of the bot's heavy components.
+
+    Components such as speech recognition are loaded lazily. warm_up loads one
+    in a background thread so the bot can connect and answer commands while
+    models are still loading; commands can report the state meanwhile.
+    """
+
+    def __init__(self):
+        self.states = {}
+        self.errors = {}
+        self.lock = threading.Lock()
+
+    def register(self, name):
+        with self.lock:
+            self.states.setdefault(name, NOT_LOADED)
+
+    def warm_up(self, name, load):
+        with self.lock:
+            if self.states.get(name) in (LOADING, READY):
+                return
+            self.states[name] = LOADING
+            self.errors.pop(name, None)
+
+        thread = threading.Thread(target=self.run_load, args=(name, load), name=f"WarmUp-{name}", daemon=True)
+        thread.start()
+
+    def run_load(self, name, load):
+        start = time.perf_counter()
+        try:
+            load()
+        except Exception as err:
+            logging.error(f"Failed to load {name}: {err}")
+            with self.lock:
+                self.states[name] = FAILED
+                self.errors[name] = str(err)
+            return
+
+        logging.info(f"{name.capitalize()} loaded in {time.perf_counter() - start:.1f}s")
+        with self.lock:
+            self.states[name] = READY
+
+    def loading(self):
+        with self.lock:
+            return [name for name, state in self.states.items() if state in (NOT_LOADED, LOADING)]
+
+    def failed(self):
+        # Failed components are loaded again by the next warm_up
+        with self.lock:
+            return {name: self.errors.get(name) for name, state in self.states.items() if state == FAILED}
@@ -0,0 +1,65 @@
+import logging
+import threading
+from contextlib import contextmanager
+
+
+class RecognizerPool:
+    """Process-wide registry of speech recognizers.
+
+    Each model is loaded once through recognizer_factory and shared by every
+    SpeechRecognitionSink. The number of transcriptions running at the same
+    time is capped by max_concurrency.
+    """
+
+    def __init__(self, recognizer_factory, default_model="base", max_concurrency=1):
+        self.recognizer_factory = recognizer_factory
+        self.default_model = default_model
+        self.recognizers = {}
+        self.recognizers_lock = threading.Lock()
+        self.inference_semaphore = threading.BoundedSemaphore(max(1, max_concurrency))
+
+    def get_recognizer(self, model_name=None):
+        if model_name is None:
+            model_name = self.default_model
+
+        recognizer = self.recognizers.get(model_name)
+        if recognizer is not None:
+            return recognizer
+
+        with self.recognizers_lock:
+            if model_name not in self.recognizers:
+                logging.info(f"Loading speech recognition model '{model_name}'...")
+                recognizer = self.recognizer_factory(model_name)
+                recognizer.load()
+                self.recognizers[model_name] = recognizer
+                logging.info(f"Speech recognition model '{model_name}' loaded")
+            return self.recognizers[model_name]
+
+    def preload(self, model_names=None):
+        if not model_names:
+            model_names = [self.default_model]
+
+        for model_name in model_names:
+            self.get_recognizer(model_name)
+
+    @contextmanager
+    def borrow(self, model_name=None):
+        recognizer = self.get_recognizer(model_name)
+        with self.inference_semaphore:
+            yield recognizer
+
+    def transcribe_batch(self, audios, language, model_name=None, keywords=None):
+        with self.borrow(model_name) as recognizer:
+            return recognizer.transcribe_batch(audios, language, keywords)
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_default_pool(recognizer_factory, default_model="base", max_concurrency=1):
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = RecognizerPool(recognizer_factory, default_model, max_concurrency)
+        return _default_pool
@@ -0,0 +1,406 @@
+import configargparse
+import logging
+import os
+import os.path
+import random
+import resource
+import statistics
+import tempfile
+import threading
+import time
+import numpy as np
+from SpeechRecognitionSink import SpeechRecognitionSink, SILENCE_HANGOVER_TIME, UTTERANCE_FLUSH_INTERVAL
+from TranscriptionScheduler import TranscriptionScheduler
+from PhraseMatcher import PhraseMatcher
+from ForbiddenPhraseRegistry import read_phrase_file
+from TtsCache import TtsCache, create_tts_backend, decode_to_pcm
+from RecognizerPool import RecognizerPool
+from SpeechRecognizer import RECOGNIZER_BACKENDS, check_compute_type, create_recognizer
+from AsrWorkerService import RecognizerSettings, RemoteRecognizer, spawn_local_workers
+
+# Offline benchmark of the speech pipeline. Synthetic or recorded PCM is
+# replayed in real time for several speakers into a SpeechRecognitionSink
+# attached to a stub voice client, exactly as Discord's decoder thread would.
+
+SAMPLING_RATE = 48000
+CHANNELS = 2
+FRAME_TIME = 0.02
+FRAME_SIZE = int(SAMPLING_RATE * FRAME_TIME) * CHANNELS * 2
+
+NEUTRAL_PHRASES = [
+    "what are we playing tonight",
+    "can you hear me now",
+    "I think the server is lagging again",
+    "give me a second to grab a drink",
+]
+
+
+class StubDecoder:
+    CHANNELS = CHANNELS
+    SAMPLING_RATE = SAMPLING_RATE
+
+
+class StubVoiceClient:
+    """Just enough of discord.VoiceClient for a sink to run."""
+
+    def __init__(self):
+        self.decoder = StubDecoder()
+        self.recording = True
+
+    def stop_recording(self):
+        self.recording = False
+
+
+class Utterance:
+    __slots__ = ("pcm", "expected_phrase", "text")
+
+    def __init__(self, pcm, expected_phrase, text):
+        self.pcm = pcm
+        self.expected_phrase = expected_phrase
+        self.text = text
+
+    @property
+    def duration(self):
+        return len(self.pcm) / (SAMPLING_RATE * CHANNELS * 2)
+
+
+class BenchmarkScheduler(TranscriptionScheduler):
+    """Tags every chunk with the utterance being played when it was submitted."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.current_utterance = {}
+        self.submitted = 0
+        self.lock = threading.Lock()
+
+    def submit(self, sink, user, audio, utterance_id=None, partial=False):
+        if not partial:
+            with self.lock:
+                self.submitted += 1
+        super().submit(sink, (user, self.current_utterance.get(user)), audio, utterance_id, partial)
+
+
+class BenchmarkResults:
+    def __init__(self, matcher, threshold):
+        self.matcher = matcher
+        self.threshold = threshold
+        self.lock = threading.Lock()
+        self.utterance_ends = {}
+        self.callback_times = {}
+        self.detection_times = {}
+        self.texts = {}
+        self.completed = 0
+        self.partials = 0
+
+    def text_callback(self, sink, tag, text, utterance_id=None, partial=False):
+        now = time.perf_counter()
+        detected = self.matcher.best_match(text, self.threshold) is not None
+
+        with self.lock:
+            if detected:
+                self.detection_times.setdefault(tag, now)
+
+            if partial:
+                self.partials += 1
+                return
+
+            self.completed += 1
+            self.callback_times[tag] = now
+            self.texts.setdefault(tag, []).append(text.strip())
+
+
+def tone_utterance(rng, duration):
+    """Voiced harmonic signal with a syllable-like envelope, for runs without TTS."""
+    sample_count = int(duration * SAMPLING_RATE)
+    t = np.arange(sample_count) / SAMPLING_RATE
+    f0 = rng.uniform(100, 220)
+
+    signal = sum(np.sin(2 * np.pi * f0 * harmonic * t) / harmonic for harmonic in range(1, 6))
+    envelope = 0.5 * (1 - np.cos(2 * np.pi * 4 * t))
+    signal = signal * envelope * 0.2 + rng.normal(0, 0.002, sample_count)
+
+    samples = np.clip(signal * 32767, -32768, 32767).astype(np.int16)
+    return np.repeat(samples, CHANNELS).tobytes()
+
+
+def synthesize_utterances(args, phrases, rng):
+    if args.source == "tone":
+        return [Utterance(tone_utterance(rng, rng.uniform(1.0, 2.5)), None, None) for _ in range(len(phrases))]
+
+    cache_dir = args.tts_cache_dir or os.path.join(tempfile.gettempdir(), "prisonbot_benchmark_tts")
+    tts_cache = TtsCache(create_tts_backend(args.source), cache_dir)
+
+    utterances = []
+    for text, expected_phrase in phrases:
+        pcm = tts_cache.load_pcm(tts_cache.cache_key(text, args.language), text, args.language)
+        utterances.append(Utterance(pcm, expected_phrase, text))
+    return utterances
+
+
+def load_recordings(recordings_dir):
+    """Reads every audio file in the directory; <name>.txt next to it holds the expected phrase."""
+    utterances = []
+    for name in sorted(os.listdir(recordings_dir)):
+        path = os.path.join(recordings_dir, name)
+        base, extension = os.path.splitext(path)
+        if extension == ".txt" or not os.path.isfile(path):
+            continue
+
+        expected_phrase = None
+        if os.path.exists(base + ".txt"):
+            lines = read_phrase_file(base + ".txt")
+            expected_phrase = lines[0] if lines else None
+
+        with open(path, "rb") as fin:
+            utterances.append(Utterance(decode_to_pcm(fin.read()), expected_phrase, expected_phrase))
+    return utterances
+
+
+def plan_phrases(args, escape_phrase, forbidden_phrases, rng):
+    choices = [(escape_phrase, escape_phrase)]
+    choices += [(phrase, phrase) for phrase in forbidden_phrases]
+    choices += [(phrase, None) for phrase in NEUTRAL_PHRASES]
+    return [rng.choice(choices) for _ in range(args.utterances)]
+
+
+def feed_speaker(sink, scheduler, results, user, utterances, args, start_delay):
+    frame_interval = FRAME_TIME / args.speed
+    # Discord sends nothing while a user is silent, so the gap must outlast the hangover
+    gap = max(args.gap / args.speed, SILENCE_HANGOVER_TIME + 2 * UTTERANCE_FLUSH_INTERVAL)
+
+    time.sleep(start_delay)
+
+    for index, utterance in enumerate(utterances):
+        scheduler.current_utterance[user] = index
+        pcm = memoryview(utterance.pcm)
+        next_frame = time.perf_counter()
+
+        for offset in range(0, len(pcm) - FRAME_SIZE + 1, FRAME_SIZE):
+            sink.write(pcm[offset:offset + FRAME_SIZE], user)
+            next_frame += frame_interval
+            delay = next_frame - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        with results.lock:
+            results.utterance_ends[(user, index)] = time.perf_counter()
+        time.sleep(gap)
+
+
+def resident_memory():
+    try:
+        with open("/proc/self/statm", "r") as fin:
+            return int(fin.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def create_transcriber(args):
+    if args.recognizer == "none":
+        return lambda audios, language, model_name=None, keywords=None: [""] * len(audios)
+
+    if args.asr_workers > 0:
+        settings = RecognizerSettings(args.recognizer, args.asr_model, args.asr_device, args.asr_compute_type, args.asr_threads, 1, True)
+        _, addresses, authkey = spawn_local_workers(args.asr_workers, settings)
+        pool = RecognizerPool(lambda model_name: RemoteRecognizer(model_name, addresses, authkey), args.asr_model, args.asr_workers)
+    else:
+        pool = RecognizerPool(
+            lambda model_name: create_recognizer(args.recognizer, model_name, args.asr_device, args.asr_compute_type, args.asr_threads),
+            args.asr_model,
+            args.asr_max_concurrency
+        )
+    pool.preload()
+    return pool.transcribe_batch
+
+
+def run_benchmark(args):
+    rng = random.Random(args.seed)
+    np_rng = np.random.default_rng(args.seed)
+
+    forbidden_phrases = read_phrase_file(args.forbidden_path) if os.path.exists(args.forbidden_path) else []
+    matcher = PhraseMatcher([args.escape_phrase] + forbidden_phrases)
+
+    if args.recordings:
+        library = load_recordings(args.recordings)
+        speakers = {user: [rng.choice(library) for _ in range(args.utterances)] for user in range(1, args.speakers + 1)}
+    else:
+        speakers = {}
+        for user in range(1, args.speakers + 1):
+            phrases = plan_phrases(args, args.escape_phrase, forbidden_phrases, rng)
+            speakers[user] = synthesize_utterances(args, phrases, np_rng)
+
+    transcribe_batch = create_transcriber(args)
+
+    results = BenchmarkResults(matcher, args.threshold)
+    scheduler = BenchmarkScheduler(
+        transcribe_batch,
+        max(args.transcription_workers, args.asr_workers),
+        args.transcription_queue_size,
+        args.transcription_batch_size,
+        args.transcription_batch_window
+    )
+    scheduler.start()
+
+    voice_client = StubVoiceClient()
+    sink = SpeechRecognitionSink(
+        None,
+        None,
+        results.text_callback,
+        args.language,
+        scheduler,
+        model_name=args.asr_model,
+        partial_interval=args.partial_interval if args.streaming else None
+    )
+    if args.keyword_spotting:
+        sink.keywords = tuple(forbidden_phrases + [args.escape_phrase])
+    sink.init(voice_client)
+
+    audio_time = sum(utterance.duration for utterances in speakers.values() for utterance in utterances)
+    logging.info(f"Replaying {audio_time:.1f}s of speech from {len(speakers)} speakers at {args.speed}x speed...")
+
+    memory_before = resident_memory()
+    cpu_before = time.process_time()
+    wall_before = time.perf_counter()
+
+    feeders = [
+        threading.Thread(target=feed_speaker, args=(sink, scheduler, results, user, utterances, args, rng.uniform(0, args.gap)), daemon=True)
+        for user, utterances in speakers.items()
+    ]
+    for feeder in feeders:
+        feeder.start()
+    for feeder in feeders:
+        feeder.join()
+
+    # Let the last utterances flush and the workers drain the queue
+    drain_deadline = time.perf_counter() + args.drain_timeout
+    time.sleep(SILENCE_HANGOVER_TIME + 2 * UTTERANCE_FLUSH_INTERVAL)
+    while time.perf_counter() < drain_deadline:
+        with results.lock:
+            done = results.completed + scheduler.dropped_jobs >= scheduler.submitted
+        if done:
+            break
+        time.sleep(0.05)
+
+    wall_time = time.perf_counter() - wall_before
+    cpu_time = time.process_time() - cpu_before
+    memory_after = resident_memory()
+
+    voice_client.stop_recording()
+    sink.cleanup()
+    scheduler.stop()
+
+    report(args, speakers, results, scheduler, matcher, audio_time, wall_time, cpu_time, memory_before, memory_after)
+
+
+def report(args, speakers, results, scheduler, matcher, audio_time, wall_time, cpu_time, memory_before, memory_after):
+    latencies = []
+    detection_latencies = []
+    evaluated = 0
+    correct = 0
+
+    for user, utterances in speakers.items():
+        for index, utterance in enumerate(utterances):
+            tag = (user, index)
+            end = results.utterance_ends.get(tag)
+            callback_time = results.callback_times.get(tag)
+            if end is not None and callback_time is not None:
+                latencies.append(callback_time - end)
+
+            detection_time = results.detection_times.get(tag)
+            if end is not None and detection_time is not None and utterance.expected_phrase:
+                detection_latencies.append(detection_time - end)
+
+            if args.recognizer == "none" or (args.source == "tone" and not args.recordings):
+                continue
+
+            text = " ".join(results.texts.get(tag, []))
+            match = matcher.best_match(text, args.threshold)
+            predicted = match.phrase if match else None
+            evaluated += 1
+            if predicted == utterance.expected_phrase:
+                correct += 1
+            else:
+                logging.debug(f"Utterance '{utterance.text}' transcribed as '{text}', matched {predicted}")
+
+    utterance_count = sum(len(utterances) for utterances in speakers.values())
+
+    print(f"Speakers:              {len(speakers)}")
+    print(f"Utterances:            {utterance_count}, {audio_time:.1f}s of speech in {wall_time:.1f}s")
+    print(f"Chunks:                {scheduler.submitted} submitted, {results.completed} transcribed, {scheduler.dropped_jobs} dropped, {results.partials} partial results")
+
+    if latencies:
+        print(f"Latency (end of utterance to callback): p50 {statistics.median(latencies) * 1000:.0f}ms, "
+              f"p95 {percentile(latencies, 0.95) * 1000:.0f}ms, max {max(latencies) * 1000:.0f}ms")
+    else:
+        print("Latency:               no utterance reached the callback")
+
+    if detection_latencies:
+        # Negative values mean the phrase was found before the speaker stopped talking
+        print(f"Phrase detection (end of utterance to first match): p50 {statistics.median(detection_latencies) * 1000:.0f}ms, "
+              f"p95 {percentile(detection_latencies, 0.95) * 1000:.0f}ms, max {max(detection_latencies) * 1000:.0f}ms")
+
+    print(f"CPU:                   {cpu_time:.2f}s, {cpu_time / audio_time:.3f}s per audio second")
+
+    if memory_before is not None and memory_after is not None:
+        print(f"Memory growth:         {(memory_after - memory_before) / (1024 * 1024):.1f} MiB")
+    print(f"Peak memory:           {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MiB")
+
+    if evaluated:
+        print(f"Match accuracy:        {correct}/{evaluated} ({100 * correct / evaluated:.1f}%)")
+    else:
+        print("Match accuracy:        not measured (no transcripts or no expected phrases)")
+
+
+def main():
+    parser = configargparse.ArgParser(
+                    prog='SpeechBenchmark',
+                    description='Offline benchmark of the PrisonBot speech recognition pipeline'
+                    )
+
+    parser.add_argument("--speakers", help="Number of simultaneous speakers", type=int, default=4)
+    parser.add_argument("--utterances", help="Utterances per speaker", type=int, default=5)
+    parser.add_argument("--source", help="How utterances are produced when --recordings is not given", choices=["espeak", "tone"], default="espeak")
+    parser.add_argument("--recordings", help="Directory of recorded utterances; <name>.txt next to a file holds its expected phrase")
+    parser.add_argument("--tts_cache_dir", help="Directory for synthesized utterances (default: a temporary directory)")
+    parser.add_argument("--escape_phrase", help="Escape phrase spoken by the speakers", default="let me out")
+    parser.add_argument("--forbidden_path", help="Path to list of forbidden phrases", default="config/forbidden_phrases.txt")
+    parser.add_argument("--threshold", help="Phrase match threshold", type=int, default=80)
+    parser.add_argument("--language", help="Speech language", default="en")
+    parser.add_argument("--speed", help="Replay speed relative to real time", type=float, default=1.0)
+    parser.add_argument("--gap", help="Silence between utterances of a speaker (in seconds)", type=float, default=1.5)
+    parser.add_argument("--drain_timeout", help="How long to wait for outstanding transcriptions after replay (in seconds)", type=float, default=60)
+    parser.add_argument("--seed", help="Random seed", type=int, default=0)
+    parser.add_argument("--recognizer", help="Speech recognition engine; 'none' measures capture and scheduling only", choices=list(RECOGNIZER_BACKENDS) + ["none"], default="whisper")
+    parser.add_argument("--asr_model", help="Speech recognition model size", default="base")
+    parser.add_argument("--asr_device", help="Device running speech recognition", default="cpu")
+    parser.add_argument("--asr_compute_type", help="Model precision: default, float16 or float32, or any CTranslate2 type such as int8 for faster-whisper", default="default")
+    parser.add_argument("--asr_threads", help="CPU threads used by speech recognition (0 lets the engine decide)", type=int, default=0)
+    parser.add_argument("--asr_workers", help="Run speech recognition in this many local worker processes (0 runs it in the benchmark process)", type=int, default=0)
+    parser.add_argument("--streaming", help="Also transcribe unfinished speech as partial results", action="store_true")
+    parser.add_argument("--partial_interval", help="Seconds of new speech between partial transcriptions in streaming mode", type=float, default=0.5)
+    parser.add_argument("--keyword_spotting", help="Prime recognition with the escape and forbidden phrases", action="store_true")
+    parser.add_argument("--asr_max_concurrency", help="Maximum number of simultaneous transcriptions", type=int, default=1)
+    parser.add_argument("--transcription_workers", help="Number of threads running speech transcription", type=int, default=1)
+    parser.add_argument("--transcription_queue_size", help="Maximum number of audio chunks waiting for transcription", type=int, default=16)
+    parser.add_argument("--transcription_batch_size", help="Maximum number of audio chunks transcribed together in one batch", type=int, default=8)
+    parser.add_argument("--transcription_batch_window", help="How long to wait for more chunks before running a batch (in seconds)", type=float, default=0.05)
+    parser.add_argument("--log_level", help="Log level", choices=['DEBUG', 'INFO', 'WARNING', "ERROR", "FATAL"], default="WARNING")
+
+    args = parser.parse_args()
+
+    try:
+        check_compute_type(args.recognizer, args.asr_compute_type)
+    except ValueError as err:
+        parser.error(str(err))
+
+    logging.basicConfig(level=args.log_level, format='[{asctime}] [{levelname:<8}] {message}', style='{')
+    run_benchmark(args)
+
+
+if __name__ == "__main__":
+    main()
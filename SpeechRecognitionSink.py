@@ -1,19 +1,57 @@
 from discord.sinks import Sink
 from discord.commands import context
 import discord
-import numpy as np
 import logging
+import threading
+import time
+import numpy as np
 from discord.ext import commands
-import whisper
-import wave
-import io
+from AudioConversion import pcm_to_whisper_audio, WHISPER_SAMPLING_RATE
+from AudioRingBuffer import AudioRingBuffer
+from VoiceActivityDetector import VoiceActivityDetector
+import Metrics
 
 
 RECOGNITION_TIME_CHUNK = 3
-BUFFER_CLEAN_TIME = 6
+RECOGNITION_OVERLAP_TIME = 1
+RING_BUFFER_TIME = 10
+SPEECH_PREROLL_TIME = 0.2
+SILENCE_HANGOVER_TIME = 0.5
+UTTERANCE_FLUSH_INTERVAL = 0.25
+
+logger = logging.getLogger("prisonbot.audio")
+
+AUDIO_PACKETS = Metrics.counter("prisonbot_audio_packets_total", "Voice packets received from Discord")
+AUDIO_WRITE_SECONDS = Metrics.histogram("prisonbot_audio_write_seconds", "Time spent converting and analysing one voice packet", (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05))
+SPEECH_CHUNKS = Metrics.counter("prisonbot_speech_chunks_total", "Speech chunks submitted for transcription")
+SPEECH_SECONDS = Metrics.counter("prisonbot_speech_seconds_total", "Seconds of speech submitted for transcription")
+SPEECH_PARTIALS = Metrics.counter("prisonbot_speech_partials_total", "Partial windows of unfinished speech submitted in streaming mode")
+
+
+class SpeakerState:
+    __slots__ = ("buffer", "utterance_start", "utterance_id", "chunk_start", "partial_position", "last_speech_position", "last_packet_time")
+
+    def __init__(self):
+        self.buffer = AudioRingBuffer(RING_BUFFER_TIME * WHISPER_SAMPLING_RATE)
+        self.utterance_start = None
+        self.utterance_id = 0
+        self.chunk_start = 0
+        self.partial_position = 0
+        self.last_speech_position = 0
+        self.last_packet_time = 0
+
 
 class SpeechRecognitionSink(Sink):
-    def __init__(self, bot, ctx, text_callback, whisper_language, *, filters=None):
+    """Splits every speaker's audio into utterances and submits them for transcription.
+
+    text_callback(sink, user, text, utterance_id, partial) receives the results.
+    With partial_interval set, the unfinished part of an utterance is also
+    submitted every partial_interval seconds of speech as a partial result, so
+    phrases are found before the speaker stops talking. Results of one
+    utterance share its utterance_id.
+    """
+
+    def __init__(self, bot, ctx, text_callback, whisper_language, scheduler, *, model_name=None, filters=None, partial_interval=None):
         Sink.__init__(self, filters=filters)
         self.ctx = ctx
         self.bot = bot
@@ -23,56 +61,164 @@ class SpeechRecognitionSink(Sink):
             logging.error("Text Recognition callback is not defined!")
 
         self.whisper_language = whisper_language
-        self.recognition_timestamps = {}
-
-        self.model = whisper.load_model("base")
-
+        self.speakers = {}
+        self.speakers_lock = threading.Lock()
+        self.vad = VoiceActivityDetector()
+        self.flush_stop_event = threading.Event()
+
+        self.speech_samples = 0
+        self.silence_samples = 0
+        self.submitted_samples = 0
+
+        self.model_name = model_name
+        self.scheduler = scheduler
+        self.partial_interval = partial_interval
+        # Set of user ids whose audio is processed, updated in place by the owner.
+        # Unlike Filters.container, an empty set admits nobody.
+        self.admitted_users = filters.get("users") if filters else None
+        # Tuple of phrases to listen for in keyword spotting mode, None transcribes everything
+        self.keywords = None
+
+    def init(self, vc):
+        Sink.init(self, vc)
+        flush_thread = threading.Thread(target=self.flush_loop, name="UtteranceFlush", daemon=True)
+        flush_thread.start()
 
     def format_audio(self, audio):
         if self.vc.recording:
             raise Exception(
                 "Audio may only be formatted after recording is finished."
             )
-        
-    def recognise_speech(self):
-        for i, user_audio in enumerate(self.get_all_audio()):
-
-            user = list(self.audio_data.keys())[i]
-
-            data_chunk_size = self.vc.decoder.SAMPLES_PER_FRAME * self.vc.decoder.SAMPLE_SIZE
-            recorded_bytes_length = user_audio.getbuffer().nbytes
-            recorded_time = recorded_bytes_length / self.vc.decoder.FRAME_SIZE * self.vc.decoder.FRAME_LENGTH / 1000
-
-            if user not in self.recognition_timestamps:
-                self.recognition_timestamps[user] = 0
-
-            if recorded_time - self.recognition_timestamps[user] < RECOGNITION_TIME_CHUNK:
-                continue
 
-            logging.info(f"{user} recorded time: {recorded_time}")
-            self.recognition_timestamps[user] = recorded_time
-
-            pcm_data_16 = np.frombuffer(user_audio.getbuffer(), np.int16)
-
-            wav_file_path = f'{self.bot.args.downloads_dir}/{user}.wav'
-
-            with wave.open(wav_file_path, 'wb') as wavfile:
-                wavfile.setnchannels(self.vc.decoder.CHANNELS)
-                wavfile.setsampwidth(4 // self.vc.decoder.CHANNELS)
-                wavfile.setframerate(self.vc.decoder.SAMPLING_RATE)
-                wavfile.writeframes(pcm_data_16)
-
-            result = self.model.transcribe(wav_file_path, language=self.whisper_language)
-            recognized_text = result["text"]
-            self.text_callback(self, user, recognized_text)
+    def skipped_time(self):
+        return self.silence_samples / WHISPER_SAMPLING_RATE
+
+    def submit_window(self, user, state, start_position, end_position, partial=False):
+        audio = state.buffer.read(start_position, end_position)
+        if audio.size == 0:
+            return
+
+        if partial:
+            SPEECH_PARTIALS.inc()
+        else:
+            self.submitted_samples += audio.size
+            SPEECH_CHUNKS.inc()
+            SPEECH_SECONDS.inc(audio.size / WHISPER_SAMPLING_RATE)
+            state.partial_position = end_position
+            logger.debug(f"{user} speech chunk: {audio.size / WHISPER_SAMPLING_RATE:.2f}s")
+
+        self.scheduler.submit(self, user, audio, state.utterance_id, partial)
+
+    def finish_utterance(self, user, state):
+        tail = int(SILENCE_HANGOVER_TIME * WHISPER_SAMPLING_RATE)
+        window_start = max(state.utterance_start, state.chunk_start - RECOGNITION_OVERLAP_TIME * WHISPER_SAMPLING_RATE)
+        window_end = min(state.buffer.total_written, state.last_speech_position + tail)
+        self.submit_window(user, state, window_start, window_end)
+        state.utterance_start = None
+
+    def recognise_speech(self, user, state):
+        if state.utterance_start is None:
+            return
+
+        recorded_position = state.buffer.total_written
+
+        if recorded_position - state.last_speech_position >= SILENCE_HANGOVER_TIME * WHISPER_SAMPLING_RATE:
+            self.finish_utterance(user, state)
+            return
+
+        window_start = max(state.utterance_start, state.chunk_start - RECOGNITION_OVERLAP_TIME * WHISPER_SAMPLING_RATE)
+
+        if recorded_position - state.chunk_start >= RECOGNITION_TIME_CHUNK * WHISPER_SAMPLING_RATE:
+            self.submit_window(user, state, window_start, recorded_position)
+            state.chunk_start = recorded_position
+        elif self.partial_interval and recorded_position - state.partial_position >= self.partial_interval * WHISPER_SAMPLING_RATE:
+            self.submit_window(user, state, window_start, recorded_position, partial=True)
+            state.partial_position = recorded_position
+
+    def update_speech_state(self, user, state, packet_start, samples):
+        speech = self.vad.speech_frames(samples)
+        speech_indices = np.flatnonzero(speech)
+
+        if speech_indices.size == 0:
+            if state.utterance_start is None:
+                self.silence_samples += samples.size
+            return
+
+        frame_length = self.vad.frame_length
+        speech_start = packet_start + int(speech_indices[0]) * frame_length
+
+        if state.utterance_start is not None and speech_start - state.last_speech_position >= SILENCE_HANGOVER_TIME * WHISPER_SAMPLING_RATE:
+            self.finish_utterance(user, state)
+
+        if state.utterance_start is None:
+            self.silence_samples += speech_start - packet_start
+            preroll = int(SPEECH_PREROLL_TIME * WHISPER_SAMPLING_RATE)
+            state.utterance_start = max(state.buffer.oldest_position, speech_start - preroll)
+            state.utterance_id += 1
+            state.chunk_start = state.utterance_start
+            state.partial_position = state.utterance_start
+
+        state.last_speech_position = packet_start + (int(speech_indices[-1]) + 1) * frame_length
+        self.speech_samples += speech_indices.size * frame_length
+
+    def buffered_bytes(self):
+        # Audio of unfinished utterances that is still waiting to be submitted
+        with self.speakers_lock:
+            return sum(
+                (state.buffer.total_written - state.utterance_start) * state.buffer.samples.itemsize
+                for state in self.speakers.values()
+                if state.utterance_start is not None
+            )
 
-            if recorded_time >= BUFFER_CLEAN_TIME:
-                stream = io.BytesIO()
-                self.audio_data[user] = discord.sinks.AudioData(stream)
-                self.recognition_timestamps[user] = 0
+    def forget_user(self, user):
+        with self.speakers_lock:
+            self.speakers.pop(user, None)
+        self.scheduler.discard_user(self, user)
 
     def write(self, pcm_bytes, user):
-        Sink.write(self, pcm_bytes, user)
-        
-        self.recognise_speech()
-        
+        if self.admitted_users is not None and user not in self.admitted_users:
+            return
+
+        AUDIO_PACKETS.inc()
+        with AUDIO_WRITE_SECONDS.time():
+            self.write_samples(pcm_bytes, user)
+
+    def write_samples(self, pcm_bytes, user):
+        samples = pcm_to_whisper_audio(pcm_bytes, self.vc.decoder.CHANNELS, self.vc.decoder.SAMPLING_RATE)
+
+        with self.speakers_lock:
+            state = self.speakers.get(user)
+            if state is None:
+                # Checked again under the lock, the user may have been forgotten since write let the packet in
+                if self.admitted_users is not None and user not in self.admitted_users:
+                    return
+                state = SpeakerState()
+                self.speakers[user] = state
+
+            packet_start = state.buffer.total_written
+            state.buffer.write(samples)
+            state.last_packet_time = time.monotonic()
+
+            self.update_speech_state(user, state, packet_start, samples)
+            self.recognise_speech(user, state)
+
+    def flush_loop(self):
+        while not self.flush_stop_event.wait(UTTERANCE_FLUSH_INTERVAL):
+            now = time.monotonic()
+            with self.speakers_lock:
+                for user, state in self.speakers.items():
+                    if state.utterance_start is not None and now - state.last_packet_time >= SILENCE_HANGOVER_TIME:
+                        self.finish_utterance(user, state)
+
+    def stop(self):
+        # Stops flushing and drops queued chunks; also used when the voice client is already gone
+        self.flush_stop_event.set()
+        self.scheduler.discard_sink(self)
+
+    def cleanup(self):
+        self.stop()
+        Sink.cleanup(self)
+
+        total_samples = self.speech_samples + self.silence_samples
+        if total_samples:
+            logging.info(f"Voice activity detection skipped {self.skipped_time():.1f}s of {total_samples / WHISPER_SAMPLING_RATE:.1f}s recorded audio")
@@ -0,0 +1,201 @@
+import functools
+import logging
+import numpy as np
+from PhraseMatcher import PhraseMatcher
+
+
+# Keyword spotting only needs the few words of a phrase, not a full transcript
+KEYWORD_SAMPLE_LEN = 32
+KEYWORD_MATCH_THRESHOLD = 80
+
+
+def keyword_prompt(keywords):
+    # Whisper keeps the end of an over-long prompt, so callers put the most important keywords last
+    return ", ".join(keywords) + "."
+
+
+@functools.lru_cache(maxsize=64)
+def keyword_matcher(keywords):
+    return PhraseMatcher(keywords)
+
+
+class KeywordStopFilter:
+    """Whisper logit filter ending a clip's decoding once its text matches a keyword.
+
+    Added to a DecodingTask, it forces the end-of-text token for every batch
+    row whose sampled text already contains one of the keywords.
+    """
+
+    def __init__(self, tokenizer, sample_begin, keywords):
+        self.tokenizer = tokenizer
+        self.sample_begin = sample_begin
+        self.matcher = keyword_matcher(keywords)
+        self.matched_rows = set()
+
+    def apply(self, logits, tokens):
+        eot = self.tokenizer.eot
+        for row in range(tokens.shape[0]):
+            if row not in self.matched_rows:
+                sampled = [token for token in tokens[row, self.sample_begin:].tolist() if token < eot]
+                if not sampled or not self.matcher.best_match(self.tokenizer.decode(sampled), KEYWORD_MATCH_THRESHOLD):
+                    continue
+                self.matched_rows.add(row)
+
+            logits[row, :] = -float("inf")
+            logits[row, eot] = 0
+
+
+WHISPER_COMPUTE_TYPES = ("default", "float16", "float32")
+
+
+def check_compute_type(backend, compute_type):
+    """Raises ValueError if the backend cannot run models in compute_type."""
+    if backend == "whisper" and compute_type not in WHISPER_COMPUTE_TYPES:
+        raise ValueError(
+            f"The whisper backend supports compute types {', '.join(WHISPER_COMPUTE_TYPES)}, "
+            f"use the faster-whisper backend for '{compute_type}'"
+        )
+
+
+class WhisperRecognizer:
+    """OpenAI Whisper on PyTorch.
+
+    compute_type "float16" and "float32" force the precision, "default" uses
+    float16 on GPU and float32 on CPU. Quantized models need faster-whisper:
+    whisper's own Linear layers are not picked up by PyTorch's dynamic
+    quantization.
+    """
+
+    name = "whisper"
+
+    def __init__(self, model_size="base", device=None, compute_type="default", threads=0):
+        check_compute_type(self.name, compute_type)
+        self.model_size = model_size
+        self.device = device
+        self.compute_type = compute_type
+        self.threads = threads
+        self.model = None
+        self.fp16 = False
+
+    def load(self):
+        import torch
+        import whisper
+
+        if self.threads > 0:
+            torch.set_num_threads(self.threads)
+
+        model = whisper.load_model(self.model_size, device=self.device)
+
+        if self.compute_type == "default":
+            self.fp16 = model.device.type != "cpu"
+        else:
+            self.fp16 = self.compute_type == "float16"
+
+        self.model = model
+
+    def transcribe_batch(self, audios, language, keywords=None):
+        """Transcribes several 16 kHz float32 clips in one padded batch.
+
+        Every clip must be shorter than Whisper's 30 second context. With
+        keywords, decoding is primed with them, limited to a few tokens and
+        stopped as soon as a keyword is heard.
+        """
+        import torch
+        import whisper
+
+        mels = [
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(np.asarray(audio, dtype=np.float32)), self.model.dims.n_mels)
+            for audio in audios
+        ]
+        mel_batch = torch.stack(mels).to(self.model.device)
+
+        if keywords:
+            options = whisper.DecodingOptions(
+                language=language,
+                without_timestamps=True,
+                fp16=self.fp16,
+                prompt=keyword_prompt(keywords),
+                sample_len=KEYWORD_SAMPLE_LEN
+            )
+            # whisper.decode has no hook for extra logit filters, so the task is built here
+            task = whisper.decoding.DecodingTask(self.model, options)
+            task.logit_filters.append(KeywordStopFilter(task.tokenizer, task.sample_begin, keywords))
+            results = task.run(mel_batch)
+        else:
+            options = whisper.DecodingOptions(language=language, without_timestamps=True, fp16=self.fp16)
+            results = whisper.decode(self.model, mel_batch, options)
+
+        return [result.text for result in results]
+
+
+class FasterWhisperRecognizer:
+    """Whisper on CTranslate2 through the faster-whisper package.
+
+    Supports int8 and other quantized compute types and runs several times
+    faster than PyTorch on CPU.
+    """
+
+    name = "faster-whisper"
+
+    def __init__(self, model_size="base", device=None, compute_type="int8", threads=0):
+        self.model_size = model_size
+        self.device = device or "auto"
+        self.compute_type = compute_type
+        self.threads = threads
+        self.model = None
+
+    def load(self):
+        from faster_whisper import WhisperModel
+
+        self.model = WhisperModel(self.model_size, device=self.device, compute_type=self.compute_type, cpu_threads=self.threads)
+
+    def transcribe_batch(self, audios, language, keywords=None):
+        texts = []
+        for audio in audios:
+            if keywords:
+                texts.append(self.spot_keywords(audio, language, keywords))
+                continue
+
+            segments, _ = self.model.transcribe(
+                np.asarray(audio, dtype=np.float32),
+                language=language,
+                beam_size=1,
+                without_timestamps=True,
+                condition_on_previous_text=False
+            )
+            texts.append("".join(segment.text for segment in segments))
+        return texts
+
+    def spot_keywords(self, audio, language, keywords):
+        # Segments are decoded lazily, so stop as soon as a keyword is heard
+        segments, _ = self.model.transcribe(
+            np.asarray(audio, dtype=np.float32),
+            language=language,
+            beam_size=1,
+            without_timestamps=True,
+            condition_on_previous_text=False,
+            initial_prompt=keyword_prompt(keywords),
+            max_new_tokens=KEYWORD_SAMPLE_LEN
+        )
+
+        matcher = keyword_matcher(keywords)
+        text = ""
+        for segment in segments:
+            text += segment.text
+            if matcher.best_match(text, KEYWORD_MATCH_THRESHOLD):
+                break
+        return text
+
+
+RECOGNIZER_BACKENDS = {
+    WhisperRecognizer.name: WhisperRecognizer,
+    FasterWhisperRecognizer.name: FasterWhisperRecognizer,
+}
+
+
+def create_recognizer(backend, model_size, device=None, compute_type="default", threads=0):
+    if backend not in RECOGNIZER_BACKENDS:
+        raise ValueError(f"Unknown speech recognizer '{backend}'. Available: {', '.join(RECOGNIZER_BACKENDS)}")
+
+    logging.info(f"Creating {backend} recognizer with model '{model_size}' ({compute_type}, {threads or 'default'} threads)")
+    return RECOGNIZER_BACKENDS[backend](model_size, device, compute_type, threads)
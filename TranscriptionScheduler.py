@@ -0,0 +1,156 @@
+import logging
+import threading
+import time
+from collections import deque
+import Metrics
+
+
+logger = logging.getLogger("prisonbot.transcription")
+
+TRANSCRIPTION_SECONDS = Metrics.histogram("prisonbot_transcription_seconds", "Time spent transcribing one batch of audio chunks")
+TRANSCRIPTION_BATCH_SIZE = Metrics.histogram("prisonbot_transcription_batch_size", "Number of audio chunks transcribed together", (1, 2, 4, 8, 16, 32))
+TRANSCRIPTION_QUEUE_DEPTH = Metrics.gauge("prisonbot_transcription_queue_depth", "Audio chunks waiting for transcription")
+TRANSCRIPTION_DROPPED = Metrics.counter("prisonbot_transcription_dropped_total", "Audio chunks dropped because the transcription queue was full")
+
+
+class TranscriptionJob:
+    __slots__ = ("sink", "user", "audio", "utterance_id", "partial", "batch_key")
+
+    def __init__(self, sink, user, audio, utterance_id=None, partial=False):
+        self.sink = sink
+        self.user = user
+        self.audio = audio
+        self.utterance_id = utterance_id
+        self.partial = partial
+        self.batch_key = (sink.model_name, sink.whisper_language, sink.keywords)
+
+
+class TranscriptionScheduler:
+    """Runs speech transcription on a bounded pool of worker threads.
+
+    Sinks submit ready audio chunks from the voice decoder thread and return
+    immediately. When the workers fall behind and the queue is full, the oldest
+    pending chunk is dropped so recognition keeps up with live speech.
+
+    A partial job (unfinished speech in streaming mode) replaces any partial
+    job of the same user still waiting, and a final job drops them, so stale
+    partial results are never transcribed.
+
+    A worker waits up to batch_window seconds for more chunks after the first
+    one arrives, so chunks from every user and guild that share a model and
+    language (and keywords, in keyword spotting mode) are transcribed together
+    as one batch.
+    """
+
+    def __init__(self, transcribe_batch, worker_count=1, max_queue_size=16, max_batch_size=8, batch_window=0.05):
+        self.transcribe_batch = transcribe_batch
+        self.worker_count = max(1, worker_count)
+        self.max_queue_size = max(1, max_queue_size)
+        self.max_batch_size = max(1, max_batch_size)
+        self.batch_window = batch_window
+        self.queue = deque()
+        self.condition = threading.Condition()
+        self.workers = []
+        self.running = False
+        self.dropped_jobs = 0
+
+    def start(self):
+        with self.condition:
+            if self.running:
+                return
+            self.running = True
+
+        for i in range(self.worker_count):
+            worker = threading.Thread(target=self.worker_loop, name=f"Transcription-{i}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.queue.clear()
+            self.condition.notify_all()
+
+        for worker in self.workers:
+            worker.join()
+        self.workers.clear()
+
+    def submit(self, sink, user, audio, utterance_id=None, partial=False):
+        with self.condition:
+            if any(job.partial and job.sink is sink and job.user == user for job in self.queue):
+                self.queue = deque(job for job in self.queue if not (job.partial and job.sink is sink and job.user == user))
+
+            if len(self.queue) >= self.max_queue_size:
+                dropped = self.queue.popleft()
+                self.dropped_jobs += 1
+                TRANSCRIPTION_DROPPED.inc()
+                logger.warning(f"Transcription queue is full, dropped chunk of {dropped.user}. Dropped total: {self.dropped_jobs}")
+
+            self.queue.append(TranscriptionJob(sink, user, audio, utterance_id, partial))
+            TRANSCRIPTION_QUEUE_DEPTH.set(len(self.queue))
+            self.condition.notify()
+
+    def discard_sink(self, sink):
+        with self.condition:
+            self.queue = deque(job for job in self.queue if job.sink is not sink)
+            TRANSCRIPTION_QUEUE_DEPTH.set(len(self.queue))
+
+    def discard_user(self, sink, user):
+        with self.condition:
+            self.queue = deque(job for job in self.queue if job.sink is not sink or job.user != user)
+            TRANSCRIPTION_QUEUE_DEPTH.set(len(self.queue))
+
+    def take_batch(self):
+        # Must be called with self.condition held and a non-empty queue
+        batch_key = self.queue[0].batch_key
+        deadline = time.monotonic() + self.batch_window
+
+        while self.running and len(self.queue) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self.condition.wait(remaining)
+
+        batch = []
+        remaining_jobs = deque()
+        while self.queue:
+            job = self.queue.popleft()
+            if job.batch_key == batch_key and len(batch) < self.max_batch_size:
+                batch.append(job)
+            else:
+                remaining_jobs.append(job)
+        self.queue = remaining_jobs
+        TRANSCRIPTION_QUEUE_DEPTH.set(len(self.queue))
+
+        if self.queue:
+            self.condition.notify()
+
+        return batch
+
+    def worker_loop(self):
+        while True:
+            with self.condition:
+                while self.running and not self.queue:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                batch = self.take_batch()
+
+            if not batch:
+                continue
+
+            model_name, language, keywords = batch[0].batch_key
+
+            TRANSCRIPTION_BATCH_SIZE.observe(len(batch))
+            try:
+                with TRANSCRIPTION_SECONDS.time():
+                    texts = self.transcribe_batch([job.audio for job in batch], language, model_name, keywords)
+            except Exception as err:
+                logging.error(f"Transcription of a batch of {len(batch)} chunks failed: {err}")
+                continue
+
+            for job, text in zip(batch, texts):
+                try:
+                    job.sink.text_callback(job.sink, job.user, text, job.utterance_id, job.partial)
+                except Exception as err:
+                    logging.error(f"Text recognition callback failed for {job.user}: {err}")
@@ -0,0 +1,184 @@
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import os.path
+import shutil
+import subprocess
+import threading
+from collections import OrderedDict
+
+
+class GttsBackend:
+    name = "gtts"
+    extension = "mp3"
+
+    def warm_up(self):
+        import gtts
+
+    def synthesize(self, text, language):
+        from gtts import gTTS
+
+        stream = io.BytesIO()
+        gTTS(text=text, lang=language, slow=False).write_to_fp(stream)
+        return stream.getvalue()
+
+
+class EspeakBackend:
+    """Offline TTS through the espeak-ng command line tool."""
+
+    name = "espeak"
+    extension = "wav"
+
+    def __init__(self, executable="espeak-ng"):
+        self.executable = executable
+
+    def warm_up(self):
+        if shutil.which(self.executable) is None:
+            raise FileNotFoundError(f"{self.executable} is not installed")
+
+    def synthesize(self, text, language):
+        result = subprocess.run([self.executable, "-v", language, "--stdout", text], capture_output=True, check=True)
+        return result.stdout
+
+
+TTS_BACKENDS = {
+    GttsBackend.name: GttsBackend,
+    EspeakBackend.name: EspeakBackend,
+}
+
+
+def decode_to_pcm(data, executable="ffmpeg"):
+    """Decodes encoded audio to 48 kHz stereo 16-bit PCM, the format Discord plays."""
+    result = subprocess.run(
+        [executable, "-loglevel", "error", "-i", "pipe:0", "-f", "s16le", "-ar", "48000", "-ac", "2", "pipe:1"],
+        input=data,
+        capture_output=True,
+        check=True
+    )
+    return result.stdout
+
+
+def create_tts_backend(name):
+    if name not in TTS_BACKENDS:
+        raise ValueError(f"Unknown TTS backend '{name}'. Available: {', '.join(TTS_BACKENDS)}")
+    return TTS_BACKENDS[name]()
+
+
+class TtsCache:
+    """Content-addressed cache of synthesized speech.
+
+    Entries are keyed by a hash of the backend, language and text. Every entry
+    is stored encoded on disk, and recently used entries are kept in memory
+    already decoded to PCM so they can be played without ffmpeg. Both levels
+    evict the least recently used entries once they exceed their size limits.
+    Synthesis and decoding run in an executor, and concurrent requests for the
+    same text share one synthesis.
+    """
+
+    def __init__(self, backend, cache_dir, memory_limit=64 * 1024 * 1024, disk_limit=256 * 1024 * 1024):
+        self.backend = backend
+        self.cache_dir = cache_dir
+        self.memory_limit = memory_limit
+        self.disk_limit = disk_limit
+        self.memory_cache = OrderedDict()
+        self.memory_size = 0
+        self.pending = {}
+        self.disk_lock = threading.Lock()
+
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+    def warm_up(self):
+        self.backend.warm_up()
+
+    def cache_key(self, text, language):
+        digest = hashlib.sha1(f"{self.backend.name}\0{language}\0{text}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def cache_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.{self.backend.extension}")
+
+    def remember(self, key, data):
+        if key in self.memory_cache:
+            self.memory_cache.move_to_end(key)
+            return
+
+        if len(data) > self.memory_limit:
+            return
+
+        self.memory_cache[key] = data
+        self.memory_size += len(data)
+
+        while self.memory_size > self.memory_limit:
+            _, evicted = self.memory_cache.popitem(last=False)
+            self.memory_size -= len(evicted)
+
+    def load_or_synthesize(self, key, text, language):
+        path = self.cache_path(key)
+
+        with self.disk_lock:
+            if os.path.exists(path):
+                os.utime(path)
+                with open(path, "rb") as fin:
+                    return fin.read()
+
+        data = self.backend.synthesize(text, language)
+
+        with self.disk_lock:
+            temp_path = f"{path}.tmp"
+            with open(temp_path, "wb") as fout:
+                fout.write(data)
+            os.replace(temp_path, path)
+            self.evict_disk()
+
+        return data
+
+    def load_pcm(self, key, text, language):
+        return decode_to_pcm(self.load_or_synthesize(key, text, language))
+
+    def evict_disk(self):
+        # Must be called with self.disk_lock held
+        entries = []
+        total_size = 0
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total_size += stat.st_size
+
+        if total_size <= self.disk_limit:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            if total_size <= self.disk_limit:
+                break
+            try:
+                os.remove(path)
+                total_size -= size
+            except OSError as err:
+                logging.error(f"Failed to evict TTS cache file {path}: {err}")
+
+    async def get_pcm(self, text, language):
+        key = self.cache_key(text, language)
+
+        data = self.memory_cache.get(key)
+        if data is not None:
+            self.memory_cache.move_to_end(key)
+            return data
+
+        future = self.pending.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(None, self.load_pcm, key, text, language)
+            self.pending[key] = future
+
+        try:
+            data = await future
+        finally:
+            self.pending.pop(key, None)
+
+        self.remember(key, data)
+        return data
@@ -0,0 +1,35 @@
+import numpy as np
+from AudioConversion import WHISPER_SAMPLING_RATE
+
+
+class VoiceActivityDetector:
+    """Energy and zero-crossing based voice activity detector.
+
+    Audio is split into fixed frames and every frame is classified at once
+    with NumPy. A frame is speech when it is loud enough and its zero-crossing
+    rate is not as high as broadband noise, unless it is much louder than the
+    threshold (fricatives have a high crossing rate too).
+    """
+
+    def __init__(self, sampling_rate=WHISPER_SAMPLING_RATE, frame_time=0.02, energy_threshold_db=-45.0, max_zero_crossing_rate=0.35, loud_margin_db=15.0):
+        self.frame_length = int(sampling_rate * frame_time)
+        self.energy_threshold_db = energy_threshold_db
+        self.max_zero_crossing_rate = max_zero_crossing_rate
+        self.loud_threshold_db = energy_threshold_db + loud_margin_db
+
+    def speech_frames(self, audio):
+        frame_count = audio.size // self.frame_length
+        if frame_count == 0:
+            return np.zeros(0, dtype=bool)
+
+        frames = audio[:frame_count * self.frame_length].reshape(frame_count, self.frame_length)
+
+        energy = np.einsum("ij,ij->i", frames, frames) / self.frame_length
+        energy_db = 10.0 * np.log10(energy + 1e-10)
+
+        sign_changes = np.count_nonzero(np.diff(np.signbit(frames), axis=1), axis=1)
+        zero_crossing_rate = sign_changes / self.frame_length
+
+        voiced = (energy_db > self.energy_threshold_db) & (zero_crossing_rate < self.max_zero_crossing_rate)
+        loud = energy_db > self.loud_threshold_db
+        return voiced | loud
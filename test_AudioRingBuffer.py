@@ -0,0 +1,33 @@
+import numpy as np
+from AudioRingBuffer import AudioRingBuffer
+
+
+def test_read_after_wrap_around():
+    buffer = AudioRingBuffer(10)
+    buffer.write(np.arange(100, 107, dtype=np.float32))
+    buffer.write(np.arange(107, 113, dtype=np.float32))
+
+    assert buffer.total_written == 13
+    assert buffer.oldest_position == 3
+    np.testing.assert_array_equal(buffer.read(0), np.arange(103, 113))
+    np.testing.assert_array_equal(buffer.read(8, 11), np.arange(108, 111))
+
+
+def test_oversize_write_keeps_positions():
+    buffer = AudioRingBuffer(10)
+    buffer.write(np.arange(100, 103, dtype=np.float32))
+    buffer.write(np.arange(100, 112, dtype=np.float32) + 3)
+
+    assert buffer.total_written == 15
+    np.testing.assert_array_equal(buffer.read(0), np.arange(105, 115))
+
+    buffer.write(np.array([115, 116], dtype=np.float32))
+    np.testing.assert_array_equal(buffer.read(10), np.arange(110, 117))
+
+
+def test_read_of_overwritten_samples_is_clipped():
+    buffer = AudioRingBuffer(4)
+    buffer.write(np.arange(10, dtype=np.float32))
+
+    np.testing.assert_array_equal(buffer.read(2, 8), np.arange(6, 8))
+    assert buffer.read(9, 9).size == 0
@@ -0,0 +1,84 @@
+import os
+from ForbiddenPhraseRegistry import ForbiddenPhraseRegistry
+
+GUILD_ID = 1234
+
+
+def write_phrases(path, phrases, mtime):
+    with open(path, "w", encoding="utf-8") as fout:
+        fout.write("\n".join(phrases) + "\n")
+    # Reloads notice changes by modification time, which may not advance between quick writes
+    os.utime(path, (mtime, mtime))
+
+
+def create_registry(tmp_path):
+    guild_dir = tmp_path / "guilds"
+    guild_dir.mkdir()
+    global_path = tmp_path / "forbidden.txt"
+    write_phrases(global_path, ["shut up", "go away"], 1000)
+    registry = ForbiddenPhraseRegistry(str(global_path), str(guild_dir))
+    registry.load()
+    return registry, global_path, guild_dir / f"{GUILD_ID}.txt"
+
+
+def reload(registry):
+    return registry.apply_changes(registry.scan_changes())
+
+
+def test_guild_without_file_uses_global_phrases(tmp_path):
+    registry, _, _ = create_registry(tmp_path)
+
+    assert set(registry.matcher_for(GUILD_ID).phrase_list()) == {"shut up", "go away"}
+
+
+def test_guild_file_extends_global_phrases(tmp_path):
+    registry, _, guild_path = create_registry(tmp_path)
+
+    write_phrases(guild_path, ["be quiet", "shut up"], 1000)
+    assert reload(registry) == (2, 0)
+
+    assert set(registry.matcher_for(GUILD_ID).phrase_list()) == {"shut up", "go away", "be quiet"}
+    assert set(registry.matcher_for(None).phrase_list()) == {"shut up", "go away"}
+
+
+def test_global_removal_keeps_phrases_listed_by_guild(tmp_path):
+    registry, global_path, guild_path = create_registry(tmp_path)
+    write_phrases(guild_path, ["shut up"], 1000)
+    reload(registry)
+
+    write_phrases(global_path, ["go away", "sit down"], 2000)
+    assert reload(registry) == (1, 1)
+
+    assert set(registry.matcher_for(None).phrase_list()) == {"go away", "sit down"}
+    assert set(registry.matcher_for(GUILD_ID).phrase_list()) == {"go away", "sit down", "shut up"}
+
+
+def test_guild_removal_keeps_global_phrases(tmp_path):
+    registry, _, guild_path = create_registry(tmp_path)
+    write_phrases(guild_path, ["be quiet", "go away"], 1000)
+    reload(registry)
+
+    write_phrases(guild_path, ["sit down"], 2000)
+    reload(registry)
+
+    assert set(registry.matcher_for(GUILD_ID).phrase_list()) == {"shut up", "go away", "sit down"}
+
+
+def test_deleted_guild_file_falls_back_to_global_phrases(tmp_path):
+    registry, _, guild_path = create_registry(tmp_path)
+    write_phrases(guild_path, ["be quiet"], 1000)
+    reload(registry)
+
+    os.remove(guild_path)
+    reload(registry)
+
+    assert set(registry.matcher_for(GUILD_ID).phrase_list()) == {"shut up", "go away"}
+    assert reload(registry) == (0, 0)
+
+
+def test_unchanged_files_are_not_reloaded(tmp_path):
+    registry, _, guild_path = create_registry(tmp_path)
+    write_phrases(guild_path, ["be quiet"], 1000)
+    reload(registry)
+
+    assert registry.scan_changes() == {}
@@ -0,0 +1,60 @@
+import random
+from PhraseMatcher import PhraseMatcher, phrase_score
+
+
+def test_phrase_found_inside_longer_utterance():
+    matcher = PhraseMatcher(["shut up", "let me out"])
+
+    match = matcher.best_match("okay guys can you please let me out of here right now", 80)
+
+    assert match.phrase == "let me out"
+    assert match.score == 100
+    assert match.matched_text == "let me out"
+
+
+def test_misheard_phrase_still_matches():
+    matcher = PhraseMatcher(["let me out"])
+
+    match = matcher.best_match("Please, let me outt!", 80)
+
+    assert match is not None
+    assert match.phrase == "let me out"
+
+
+def test_unrelated_text_does_not_match():
+    matcher = PhraseMatcher(["shut up", "let me out"])
+
+    assert matcher.best_match("what a nice day for a walk", 80) is None
+    assert matcher.match("") == []
+
+
+def test_candidate_pruning_finds_what_scoring_every_phrase_finds():
+    generator = random.Random(7)
+    words = ("the be to of and a in that have it for not on with he as you do at this but his by from they we say "
+             "her she or an will my one all would there what so up out if about who get which go me when make can "
+             "like time no just him know take people into year your good some could them see other than then now").split()
+    phrases = {" ".join(generator.choice(words) for _ in range(generator.randint(1, 4))) for _ in range(1500)}
+    matcher = PhraseMatcher(phrases)
+
+    texts = [
+        "well i think that you should know what they say about the people who come to work",
+        "i will not say that again you know",
+        "give us the good stuff now",
+        "get out",
+    ]
+    for text in texts:
+        found = {match.phrase for match in matcher.match(text, 80)}
+        expected = {phrase for phrase in phrases if phrase_score(text, phrase)[0] >= 80}
+        assert found == expected, text
+
+
+def test_update_phrases_reuses_removed_slots():
+    matcher = PhraseMatcher(["first phrase"])
+
+    for i in range(50):
+        matcher.update_phrases({f"phrase number {i}"}, {f"phrase number {i - 1}"})
+
+    assert len(matcher) == 2
+    assert len(matcher.phrases) == 2
+    assert matcher.best_match("this is phrase number 49", 90).phrase == "phrase number 49"
+    assert matcher.best_match("this is phrase number 48", 100) is None